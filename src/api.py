@@ -0,0 +1,389 @@
+"""Local HTTP/JSON API over the forms and their records.
+
+Lets other tools read and write forms without the GUI. Run it next to
+main.py, on the same forms.db:
+
+    python api.py --port 8765
+
+It listens on localhost only unless `--host` says otherwise. Requests
+are read by asyncio; the model calls run on a thread pool and every pool
+thread keeps its own sqlite connection, so `--pool` is the size of the
+connection pool.
+
+    GET    /forms                    forms as {id, name}
+    POST   /forms                    {name, fields: [{name, type, option_id}]}
+    GET    /forms/<id>               a form with its fields
+    DELETE /forms/<id>               a form with its records
+    GET    /options                  multi choices as {id, name, choices}
+    POST   /options                  {name, choices: [...]}
+    GET    /forms/<id>/records       ?cursor=<id>&limit=<n>; next page from next_cursor
+    POST   /forms/<id>/records       {records: [...]}; all of them or none
+    GET    /forms/<id>/records/<id>  a record with its version
+    PUT    /forms/<id>/records/<id>  {values, version}; 409 if changed since version
+    DELETE /forms/<id>/records/<id>
+
+Values are text, as in the CSV import and export; a record is a list of
+values in field order or an object of values by field name.
+"""
+
+# Builtins
+import re
+import json
+import asyncio
+import argparse
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+
+POOL_SIZE = 4  # threads, and so database connections, serving requests
+PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+MAX_BODY = 64 << 20  # bytes of a request body; bulk inserts are the big ones
+IDLE_SECONDS = 60  # an idle connection is closed after this long
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class FormApi:
+    """Handlers of the API routes; they run on the pool threads.
+
+    A handler gets the query parameters, the JSON body and the ids of
+    its path, and returns the status and the JSON payload.
+    """
+
+    ROUTES = (
+        ("GET", r"/forms", "list_forms"),
+        ("POST", r"/forms", "create_form"),
+        ("GET", r"/forms/(\d+)", "get_form"),
+        ("DELETE", r"/forms/(\d+)", "delete_form"),
+        ("GET", r"/options", "list_options"),
+        ("POST", r"/options", "create_option"),
+        ("GET", r"/forms/(\d+)/records", "list_records"),
+        ("POST", r"/forms/(\d+)/records", "insert_records"),
+        ("GET", r"/forms/(\d+)/records/(\d+)", "get_record"),
+        ("PUT", r"/forms/(\d+)/records/(\d+)", "update_record"),
+        ("DELETE", r"/forms/(\d+)/records/(\d+)", "delete_record"),
+    )
+
+    def __init__(self):
+        self.form_model = main.FormModel()
+        self.data_model = main.DataModel()
+        self.option_model = main.OptionModel()
+        self.record_model = main.RecordModel()
+        self.routes = [
+            (method, re.compile(pattern), getattr(self, name))
+            for method, pattern, name in self.ROUTES
+        ]
+
+    def handle(self, method, target, body):
+        url = urlsplit(target)
+        handler, ids = self.route(method, url.path.rstrip("/"))
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            raise ApiError(400, "Body is not valid JSON")
+        if not isinstance(data, dict):
+            raise ApiError(400, "Body must be a JSON object")
+        with main.timings().span(f"api {handler.__name__}"):
+            return handler(query, data, *ids)
+
+    def route(self, method, path):
+        allowed = []
+        for route_method, pattern, handler in self.routes:
+            if match := pattern.fullmatch(path):
+                if route_method == method:
+                    return handler, [int(id_) for id_ in match.groups()]
+                allowed.append(route_method)
+        if allowed:
+            raise ApiError(405, f"{method} not allowed; use {', '.join(allowed)}")
+        raise ApiError(404, f"No route {path}")
+
+    # Forms and options
+    def list_forms(self, query, data):
+        return 200, [{"id": id_, "name": name} for id_, name in self.form_model.get_forms()]
+
+    def create_form(self, query, data):
+        name = str(data.get("name", "")).strip()
+        fields = data.get("fields")
+        if not name or not isinstance(fields, list) or not fields:
+            raise ApiError(400, "name and fields are required")
+        if name in self.form_model.get_form_names():
+            raise ApiError(409, f"Form {name} exists")
+
+        types = self.form_model.field_types()
+        option_ids = {option[0] for option in self.option_model.get_options()}
+        rows = []
+        for field in fields:
+            field_name = str(field.get("name", "")).strip()
+            field_type = field.get("type")
+            option_id = field.get("option_id")
+            if not field_name or field_type not in types:
+                raise ApiError(400, f"Field needs a name and one of the types {types}")
+            if (field_type == "چند گزینه") != (option_id in option_ids):
+                raise ApiError(400, f"{field_name}: multi choice needs an option_id, others none")
+            rows.append((field_name, field_type, option_id))
+
+        form_id = self.form_model.save_form(name, rows)
+        if form_id is None:
+            raise ApiError(500, "Form is not saved")
+        return 201, self.form_json(self.schema(form_id))
+
+    def get_form(self, query, data, form_id):
+        return 200, self.form_json(self.schema(form_id))
+
+    def delete_form(self, query, data, form_id):
+        self.schema(form_id)
+        if not self.form_model.delete_form(form_id):
+            raise ApiError(500, "Form is not deleted")
+        return 200, {"deleted": form_id}
+
+    def list_options(self, query, data):
+        return 200, [
+            {"id": id_, "name": name, "choices": self.choices(id_)}
+            for id_, name in self.option_model.get_options()
+        ]
+
+    def create_option(self, query, data):
+        name = str(data.get("name", "")).strip()
+        choices = data.get("choices")
+        if not name or not isinstance(choices, list) or not choices:
+            raise ApiError(400, "name and choices are required")
+        option_id = self.option_model.save_multichoice(name, [str(c) for c in choices])
+        if option_id is None:
+            raise ApiError(500, "Multi choice is not saved")
+        return 201, {"id": option_id, "name": name, "choices": self.choices(option_id)}
+
+    def choices(self, option_id):
+        return [row[0] for row in self.data_model.get_options(option_id) or []]
+
+    def schema(self, form_id):
+        schema = self.data_model.get_schema(form_id)
+        if schema is None:
+            raise ApiError(404, f"No form {form_id}")
+        return schema
+
+    def form_json(self, schema):
+        fields = [
+            {"id": field.id, "name": field.name, "type": field.type, "options": field.options}
+            for field in schema.fields
+        ]
+        return {"id": schema.id, "name": schema.name, "fields": fields}
+
+    # Records
+    def list_records(self, query, data, form_id):
+        """A page of records in id order; pass next_cursor back for the next one."""
+        schema = self.schema(form_id)
+        cursor = self.int_param(query, "cursor", 0)
+        limit = min(self.int_param(query, "limit", PAGE_SIZE), MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ApiError(400, "limit must be positive")
+        page = self.record_model.find_records(form_id, after_id=cursor, limit=limit)
+        return 200, {
+            "records": [self.record_json(schema, record) for record in page],
+            "next_cursor": page[-1][0] if len(page) == limit else None,
+        }
+
+    def insert_records(self, query, data, form_id):
+        """Bulk insert in one transaction; nothing is saved if a record is invalid."""
+        schema = self.schema(form_id)
+        records = data.get("records")
+        if not isinstance(records, list) or not records:
+            raise ApiError(400, "records is required")
+        rows, errors = [], []
+        for index, record in enumerate(records):
+            try:
+                rows.append(self.parse_record(schema, record))
+            except main.ValidationError as e:
+                errors.append({"index": index, "error": str(e)})
+        if errors:
+            return 422, {"errors": errors}
+        if self.record_model.insert_records(form_id, rows) is None:
+            raise ApiError(500, "Records are not saved")
+        return 201, {"inserted": len(rows)}
+
+    def get_record(self, query, data, form_id, record_id):
+        schema = self.schema(form_id)
+        version = self.version(form_id, record_id)
+        records = self.record_model.get_records_by_ids(form_id, [record_id])
+        if not records:
+            raise ApiError(404, f"No record {record_id}")
+        return 200, {**self.record_json(schema, records[0]), "version": version}
+
+    def update_record(self, query, data, form_id, record_id):
+        """Update a record if it is still at the version the client read.
+
+        Without a version the current one is used, so the record is
+        overwritten unless it changes while the request runs.
+        """
+        schema = self.schema(form_id)
+        version = data.get("version")
+        if version is None:
+            version = self.version(form_id, record_id)
+        elif not isinstance(version, int):
+            raise ApiError(400, "version must be a number")
+        try:
+            row = self.parse_record(schema, data.get("values"))
+        except main.ValidationError as e:
+            return 422, {"errors": [{"index": 0, "error": str(e)}]}
+
+        updated = self.record_model.update_record(form_id, record_id, row, version)
+        if updated is None:
+            raise ApiError(500, "Record is not saved")
+        if not updated:
+            current = self.version(form_id, record_id)
+            raise ApiError(409, f"Record {record_id} changed; its version is {current}")
+        return 200, {"id": record_id, "version": version + 1}
+
+    def delete_record(self, query, data, form_id, record_id):
+        self.schema(form_id)
+        self.version(form_id, record_id)
+        if not self.record_model.delete_records(form_id, [record_id]):
+            raise ApiError(500, "Record is not deleted")
+        return 200, {"deleted": record_id}
+
+    def version(self, form_id, record_id):
+        version = self.record_model.get_version(form_id, record_id)
+        if version is None:
+            raise ApiError(404, f"No record {record_id}")
+        return version
+
+    def record_json(self, schema, record):
+        values = map(main.format_value, [field.type for field in schema.fields], record[1:])
+        return {"id": record[0], "values": dict(zip([f.name for f in schema.fields], values))}
+
+    def parse_record(self, schema, record):
+        """Stored values of a record; validated like a row of the CSV import."""
+        names = [field.name for field in schema.fields]
+        if isinstance(record, dict):
+            unknown = set(record) - set(names)
+            if unknown:
+                raise main.ValidationError(f"Unknown fields {sorted(unknown)}")
+            record = [record.get(name) for name in names]
+        elif not isinstance(record, list) or len(record) > len(names):
+            raise main.ValidationError(f"Expected a list of {len(names)} values")
+
+        values = []
+        for field, value in zip(schema.fields, record + [None] * (len(names) - len(record))):
+            text = "" if value is None else str(value)
+            validator = main.FIELD_VALIDATORS.get(field.type, main.validate_detail)
+            values.append(validator(field, text))
+        return values
+
+    def int_param(self, query, name, default):
+        try:
+            return int(query.get(name, default))
+        except ValueError:
+            raise ApiError(400, f"{name} must be a number")
+
+
+class ApiServer:
+    """HTTP/1.1 with keep-alive over asyncio streams; JSON in and out."""
+
+    def __init__(self, api, pool_size=POOL_SIZE):
+        self.api = api
+        self.pool = ThreadPoolExecutor(pool_size, thread_name_prefix="api")
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.on_connection, host, port)
+        print(f"API listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    async def on_connection(self, reader, writer):
+        """Serve the requests of a connection one after another."""
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await asyncio.wait_for(self.read_request(reader), IDLE_SECONDS)
+                except ApiError as e:  # the rest of the stream can't be trusted
+                    status, payload, keep_alive = e.status, {"error": str(e)}, False
+                else:
+                    if request is None:
+                        break
+                    method, target, version, headers, body = request
+                    status, payload = await self.respond(method, target, body)
+                    connection = headers.get("connection", "").lower()
+                    keep_alive = version == "HTTP/1.1" and connection != "close"
+                writer.write(self.response(status, payload, keep_alive))
+                await writer.drain()
+        except (ConnectionError, TimeoutError, asyncio.IncompleteReadError):
+            pass  # client went away or stayed idle
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        """(method, target, version, headers, body); None at the end of the stream."""
+        try:
+            line = await reader.readline()
+            if not line:
+                return None
+            method, target, version = line.decode("latin-1").split()
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0))
+        except ValueError:  # also a line over the stream limit
+            raise ApiError(400, "Malformed request")
+        if "transfer-encoding" in headers:
+            raise ApiError(411, "Content-Length is required")
+        if not 0 <= length <= MAX_BODY:
+            raise ApiError(413, f"Body must be up to {MAX_BODY} bytes")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, version, headers, body
+
+    async def respond(self, method, target, body):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.pool, self.api.handle, method, target, body)
+        except ApiError as e:
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            main.log.exception("API %s %s failed", method, target)
+            return 500, {"error": str(e)}
+
+    def response(self, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        status = HTTPStatus(status)
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        return head.encode("latin-1") + body
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1", help="localhost only by default")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pool", type=int, default=POOL_SIZE, help="database connections")
+    args = parser.parse_args()
+
+    main.setup_logging()
+    try:
+        main.migrate_database()  # the journal and data files are the desktop app's
+    except main.MigrationError as e:
+        main.log.error("API not started: %s", e)
+        raise SystemExit(f"API not started: {e}")
+    server = ApiServer(FormApi(), args.pool)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("API stopped.")
+    finally:
+        server.pool.shutdown()
+        main.Database.close_all()
+
+
+if __name__ == "__main__":
+    main_()
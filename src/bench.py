@@ -0,0 +1,266 @@
+"""Benchmarks of the data entry and data management hot paths.
+
+Runs the app headless on a copy of forms.db in a temporary directory, so
+the real database and data files are never touched:
+
+    python bench.py --fields 2 --records 100000 --output bench.json
+    python bench.py --compare bench.json
+
+A synthetic form gets `--fields` fields of every field type and
+`--records` records. Results are written as JSON; `--compare` prints
+the change of every benchmark against an earlier result file.
+"""
+
+# Builtins
+import os
+import sys
+import json
+import shutil
+import argparse
+import platform
+import sqlite3
+import tempfile
+import subprocess
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# External
+import PySide6
+from PySide6.QtCore import QItemSelectionModel
+from PySide6.QtWidgets import QApplication, QPushButton
+
+import main
+
+FORM_NAME = "فرم بنچمارک"
+CHOICES = ["الف", "ب", "ج"]
+
+# startup of the app as `python main.py` does it, without the event loop
+COLD_START = """
+import main
+from PySide6.QtWidgets import QApplication
+app = QApplication([])
+window = main.MainWindow.start(data_dir={data_dir!r})
+app.processEvents()
+"""
+
+
+def sample_value(field_type, i):
+    """Stored value of a field of the given type for the i-th record."""
+    values = {
+        "متن": f"نام {i}",
+        "عدد": i,
+        "مبلغ": i % 1000 * 1000,
+        "شماره حساب": f"{i:016d}",
+        "شماره کارت": f"{i:016d}",
+        "شماره شبا": f"{i:024d}",
+        "توضیحات": f"توضیحات رکورد {i}",
+        "تاریخ شمسی": (1400 + i % 10) * 10000 + (i % 12 + 1) * 100 + i % 28 + 1,
+        "شماره تماس": f"0912{i % 10**7:07d}",
+        "کد ملی": f"{i:010d}",
+        "چند گزینه": CHOICES[i % len(CHOICES)],
+    }
+    return values[field_type]
+
+
+class Benchmark:
+    def __init__(self, fields, records, repeat):
+        self.fields_per_type = fields
+        self.record_count = records
+        self.repeat = repeat
+        self.results = {}
+        self.app = QApplication.instance() or QApplication([])
+
+    def wait(self):
+        """Run the event loop until all tasks on the thread pool are done."""
+        while main.task_monitor().tasks:
+            self.app.processEvents()
+        self.app.processEvents()
+
+    def measure(self, name, function, setup=None, repeat=None):
+        times = []
+        for _ in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+            start = perf_counter()
+            function()
+            times.append(perf_counter() - start)
+        self.results[name] = {
+            "runs": len(times),
+            "min": min(times),
+            "median": median(times),
+            "max": max(times),
+        }
+        print(f"{name:<24} {median(times) * 1000:10.2f} ms", file=sys.stderr)
+
+    def create_form(self):
+        option_id = main.OptionModel().save_multichoice("بنچمارک", CHOICES)
+        rows = []
+        for field_type in main.FIELD_VALIDATORS:
+            for n in range(self.fields_per_type):
+                option = option_id if field_type == "چند گزینه" else None
+                rows.append((f"{field_type} {n + 1}", field_type, option))
+        self.form_id = main.FormModel().save_form(FORM_NAME, rows)
+        self.types = [field[2] for field in main.RecordModel().get_fields(self.form_id)]
+
+    def record(self, i):
+        return [sample_value(field_type, i) for field_type in self.types]
+
+    def run(self, data_dir):
+        self.cold_start(data_dir)
+        self.create_form()
+
+        record_model = main.RecordModel()
+        rows = [self.record(i) for i in range(self.record_count)]
+        insert = lambda: record_model.insert_records(self.form_id, rows)
+        self.measure("insert_records", insert, repeat=1)
+
+        window = main.MainWindow()
+        window.show()
+        self.bench_insert_form(window)
+        self.bench_data_manage(window)
+        self.bench_export(data_dir)
+        self.measure("search_records", lambda: record_model.search_records("0912"))
+        self.measure("report", lambda: record_model.get_report(self.form_id))
+        window.close()
+
+    def cold_start(self, data_dir):
+        env = {**os.environ, "PYTHONPATH": str(main.BASE_DIR)}
+        code = COLD_START.format(data_dir=str(data_dir))
+        self.measure(
+            "cold_start",
+            lambda: subprocess.run(
+                [sys.executable, "-c", code], env=env, check=True, capture_output=True
+            ),
+            repeat=max(1, self.repeat // 2),
+        )
+
+    def bench_insert_form(self, window):
+        window.load_data_insert_form()
+        form = window.frame
+
+        def select_form():
+            form.ui.form_names.setCurrentText(FORM_NAME)
+
+        def save():
+            form.on_save()
+            self.wait()
+
+        def clear_form():
+            form.ui.form_names.setCurrentIndex(-1)
+            self.app.processEvents()  # deleteLater of the previous widgets
+
+        self.measure("build_form", select_form, setup=clear_form)
+        self.measure("on_save", save, setup=lambda: form.set_values(self.record(0)))
+
+    def bench_data_manage(self, window):
+        window.load_data_manage()
+        screen = window.frame
+
+        def select_form():
+            screen.ui.form_names.setCurrentText(FORM_NAME)
+            self.wait()
+
+        def clear_form():
+            # without a signal; the screen has no handling of an empty form name
+            screen.ui.form_names.blockSignals(True)
+            screen.ui.form_names.setCurrentIndex(-1)
+            screen.ui.form_names.blockSignals(False)
+
+        def fetch_more():
+            screen.table_model.fetchMore()
+            self.wait()
+
+        def select_rows(count):
+            screen.ui.table.clearSelection()
+            selection = screen.ui.table.selectionModel()
+            flags = QItemSelectionModel.Select | QItemSelectionModel.Rows
+            for row in range(count):
+                selection.select(screen.table_model.index(row, 0), flags)
+
+        def delete():
+            screen.on_delete()
+            self.wait()
+
+        def update():
+            screen.ui.table.setCurrentIndex(screen.table_model.index(0, 0))
+            screen.on_update()
+            [save] = [b for b in screen.win.findChildren(QPushButton) if b.text() == "ذخیره"]
+            save.click()
+            self.wait()
+
+        self.measure("on_form_select", select_form, setup=clear_form)
+        self.measure("fetch_more", fetch_more)
+        self.measure("on_delete", delete, setup=lambda: select_rows(10))
+        self.measure("on_update_row", update)
+
+    def bench_export(self, data_dir):
+        suffixes = [".csv", ".jsonl"]
+        if main.RecordExporter.xlsx_available():
+            suffixes.append(".xlsx")
+        for suffix in suffixes:
+            exporter = main.RecordExporter(self.form_id, data_dir / f"export{suffix}")
+            self.measure(f"export{suffix}", lambda: list(exporter.run()), repeat=1)
+
+
+def compare(old, new):
+    """Print the change of every benchmark median; + is slower."""
+    for name, result in new["results"].items():
+        if name not in old["results"]:
+            continue
+        before, after = old["results"][name]["median"], result["median"]
+        change = (after - before) / before * 100 if before else 0
+        print(f"{name:<24} {before * 1000:10.2f} ms {after * 1000:10.2f} ms {change:+7.1f}%")
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "pyside6": PySide6.__version__,
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+    }
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fields", type=int, default=1, help="fields of every type")
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="JSON file of the results; stdout by default")
+    parser.add_argument("--compare", help="JSON file of earlier results to compare with")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="form_app_bench_"))
+    cwd = os.getcwd()  # --output and --compare are relative to it
+    try:
+        shutil.copy(main.BASE_DIR / "forms.db", workdir / "forms.db")
+        (workdir / "data").mkdir()
+        os.chdir(workdir)  # models open forms.db of the working directory
+        benchmark = Benchmark(args.fields, args.records, args.repeat)
+        benchmark.run(workdir / "data")
+        main.QThreadPool.globalInstance().waitForDone()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        "fields_per_type": args.fields,
+        "records": args.records,
+        "environment": environment(),
+        "results": benchmark.results,
+    }
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text(encoding="utf-8")), result)
+
+
+if __name__ == "__main__":
+    main_()
@@ -1,18 +1,50 @@
 # Builtins
 import sys
 import os
+import csv
+import re
+import json
+import importlib.util
+import logging
 import sqlite3
+import socket
+import getpass
+import threading
+import heapq
+from time import perf_counter, time, sleep
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
 from pathlib import Path
-
-
-from PySide6.QtCore import Qt, QRegularExpression, QFile
+from collections import namedtuple
+from functools import cache, partial
+from contextlib import contextmanager
+from types import GeneratorType
+from bisect import bisect_left
+from operator import itemgetter
+
+
+from PySide6.QtCore import (
+    Qt,
+    QRegularExpression,
+    QByteArray,
+    QBuffer,
+    QIODevice,
+    QAbstractTableModel,
+    QEventLoop,
+    QModelIndex,
+    QObject,
+    QRunnable,
+    QThreadPool,
+    QTimer,
+    QStringListModel,
+    Signal,
+)
 from PySide6.QtGui import QAction, QRegularExpressionValidator
 from PySide6.QtUiTools import QUiLoader
 
 # External
 from PySide6.QtWidgets import (
     QApplication,
-    QWidget,
     QLineEdit,
     QComboBox,
     QFrame,
@@ -25,45 +57,316 @@ from PySide6.QtWidgets import (
     QMainWindow,
     QVBoxLayout,
     QPushButton,
+    QProgressBar,
+    QHeaderView,
+    QMessageBox,
 )
 
+log = logging.getLogger("form_app")
+# developer mode: explain every distinct query and log its full table scans
+DEV_MODE = os.environ.get("FORM_APP_DEV") == "1"
+FULL_SCAN = re.compile(r"SCAN (\w+)$")
+# shared mode: forms.db on a network drive used by several desktops
+SHARED_MODE = os.environ.get("FORM_APP_SHARED") == "1"
+
+
+@cache
+def query_name(query):
+    """One line name of a query for the timings."""
+    return " ".join(query.split())[:200]
+
+
+class Timings:
+    """Durations of queries and UI actions, for the log and diagnostics.
+
+    Every span is added up by its name and the slowest ones are kept.
+    Spans slower than SLOW_SECONDS are logged; the rest only in debug.
+    Safe to use from worker threads.
+    """
+
+    SLOW_SECONDS = 0.1
+    KEEP_SLOWEST = 100
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.totals = {}  # name -> [count, seconds, max seconds, rows]
+            self.slowest = []  # heap of (seconds, time, name, rows)
+
+    def add(self, name, seconds, rows=None):
+        with self.lock:
+            total = self.totals.setdefault(name, [0, 0.0, 0.0, 0])
+            total[0] += 1
+            total[1] += seconds
+            total[2] = max(total[2], seconds)
+            total[3] += rows or 0
+            span = (seconds, time(), name, rows)
+            if len(self.slowest) < self.KEEP_SLOWEST:
+                heapq.heappush(self.slowest, span)
+            else:
+                heapq.heappushpop(self.slowest, span)
+        level = logging.INFO if seconds >= self.SLOW_SECONDS else logging.DEBUG
+        log.log(level, "%.1fms rows=%s %s", seconds * 1000, rows, name)
+
+    @contextmanager
+    def span(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter() - start)
+
+    def slowest_spans(self):
+        with self.lock:
+            return sorted(self.slowest, reverse=True)
 
-# External Libs
-import pandas as pd
+    def total_spans(self):
+        """(name, count, seconds, max seconds, rows); the most time first."""
+        with self.lock:
+            totals = [(name, *total) for name, total in self.totals.items()]
+        return sorted(totals, key=itemgetter(2), reverse=True)
 
 
+@cache
+def timings():
+    return Timings()
+
 
 class Database:
-    def __init__(self, db_filename):
+    """sqlite3 connections shared by all the models.
+
+    Use `Database.open(filename)` to get the shared instance of a file.
+    Each thread gets its own connection, opened on first use, so models
+    can be used from worker threads too.
+    Every statement commits on its own unless it runs inside a
+    `transaction()` block, which commits all of its statements at once.
+
+    In shared mode the database is used by several desktops over a network
+    drive, where WAL does not work: it keeps a rollback journal, which
+    relies only on file locks.
+    """
+
+    instances = {}  # db filename -> shared Database
+    PRAGMAS = (
+        "PRAGMA journal_mode = WAL;",
+        "PRAGMA synchronous = NORMAL;",
+        "PRAGMA cache_size = -16000;",  # 16MB
+        "PRAGMA temp_store = MEMORY;",
+    )
+    SHARED_PRAGMAS = (
+        "PRAGMA journal_mode = DELETE;",
+        "PRAGMA synchronous = FULL;",
+        "PRAGMA cache_size = -16000;",
+        "PRAGMA temp_store = MEMORY;",
+    )
+    STATEMENT_CACHE_SIZE = 256
+    BUSY_TIMEOUT = 10  # seconds to wait for a lock of another connection
+    LOCK_RETRIES = 3  # transactions try again when the wait times out
+    GUI_BUSY_TIMEOUT = 2  # the GUI thread gives up soon instead of freezing the window
+
+    def __init__(self, db_filename, explain=DEV_MODE, shared=SHARED_MODE):
         self.db_filename = db_filename
-        self.connection = None
-        self.cursor = None
+        # thread id -> (connection, cursor); a threading.local would lose them
+        # every time a QThreadPool thread finishes a task
+        self.connections = {}
+        self.local = threading.local()  # transaction state of each thread
+        self.explain = explain
+        self.shared = shared
+        self.pragmas = self.SHARED_PRAGMAS if shared else self.PRAGMAS
+        self.plans = {}  # query -> EXPLAIN QUERY PLAN details; when explain is on
         self.connect()
 
+    @property
+    def connection(self):
+        if threading.get_ident() not in self.connections:
+            self.connect()
+        return self.connections.get(threading.get_ident(), (None, None))[0]
+
+    @property
+    def cursor(self):
+        # statements of a transaction that could not begin fail like its first one would
+        if getattr(self.local, "begin_error", None) is not None:
+            raise self.local.begin_error
+        return self.connection and self.connections[threading.get_ident()][1]
+
+    @property
+    def last_error(self):
+        """Error of the last transaction of this thread that was rolled back."""
+        return getattr(self.local, "last_error", None)
+
+    @property
+    def transaction_depth(self):
+        return getattr(self.local, "transaction_depth", 0)
+
+    @transaction_depth.setter
+    def transaction_depth(self, depth):
+        self.local.transaction_depth = depth
+
+    @classmethod
+    def open(cls, db_filename):
+        if db_filename not in cls.instances:
+            cls.instances[db_filename] = cls(db_filename)
+        return cls.instances[db_filename]
+
     def connect(self):
-        if self.connection:
+        if threading.get_ident() in self.connections:
             return  # already connected
 
         try:
-            with sqlite3.connect(self.db_filename) as conn:
-                self.connection = conn
-                self.cursor = conn.cursor()
-                print("Succesfuly connect to db.")
+            gui_thread = threading.current_thread() is threading.main_thread()
+            with sqlite3.connect(
+                self.db_filename,
+                timeout=self.GUI_BUSY_TIMEOUT if gui_thread else self.BUSY_TIMEOUT,
+                cached_statements=self.STATEMENT_CACHE_SIZE,
+                check_same_thread=False,  # only its own thread uses it; close() may run anywhere
+            ) as conn:
+                cursor = conn.cursor()
+                for pragma in self.pragmas:
+                    cursor.execute(pragma)
+                self.connections[threading.get_ident()] = (conn, cursor)
+                log.debug("Connected to %s", self.db_filename)
         except sqlite3.OperationalError as e:
             print("Failed to open database:", e)
 
+    def close(self):
+        """Close the connections of all the threads; on shutdown, when they are idle."""
+        for conn, _ in self.connections.values():
+            conn.close()
+        self.connections.clear()
+
+    @classmethod
+    def close_all(cls):
+        for db in cls.instances.values():
+            db.close()
+
+    @contextmanager
+    def transaction(self):
+        """Run several statements as one atomic unit.
+
+        Nested blocks join the outermost one. On a database error all the
+        statements are rolled back, the error is printed and kept in
+        `last_error` of the thread.
+        """
+        self.transaction_depth += 1
+        try:
+            if self.transaction_depth == 1:
+                try:
+                    self.begin()
+                except sqlite3.OperationalError as e:
+                    self.local.begin_error = e
+            yield self
+        except sqlite3.Error as e:
+            self.transaction_depth -= 1
+            if self.transaction_depth:
+                raise
+            self.connection.rollback()
+            self.local.last_error = e
+            print(f"Transaction rolled back: {e}")
+        except BaseException:
+            self.transaction_depth -= 1
+            if not self.transaction_depth:
+                self.connection.rollback()
+            raise
+        else:
+            self.transaction_depth -= 1
+            if not self.transaction_depth:
+                self.connection.commit()
+        finally:
+            if not self.transaction_depth:
+                self.local.begin_error = None
+
+    @contextmanager
+    def synced(self):
+        """Commits of the block are on disk when they return.
+
+        With WAL and synchronous NORMAL the last commits can be lost at a
+        power cut; FULL syncs the WAL on every commit.
+        """
+        level = self.fetch_one(""" PRAGMA synchronous; """)[0]
+        self.execute(""" PRAGMA synchronous = FULL; """)
+        try:
+            yield self
+        finally:
+            self.execute(f""" PRAGMA synchronous = {level}; """)
+
+    def begin(self):
+        """Take the write lock; other desktops may hold it for a while.
+
+        Worker threads retry; the GUI thread waits only GUI_BUSY_TIMEOUT.
+        """
+        retries = 0 if threading.current_thread() is threading.main_thread() else self.LOCK_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                self.connection.execute("BEGIN IMMEDIATE;")
+                return
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or attempt == retries:
+                    raise
+                log.warning("Database locked; retry %d: %s", attempt + 1, e)
+                sleep(0.5 * 2**attempt)
+
+    def commit(self):
+        if not self.transaction_depth:
+            self.connection.commit()
+
+    def explain_query(self, query, params=()):
+        """Keep the plan of a query the first time it runs; log its full scans."""
+        if query in self.plans:
+            return
+        try:
+            rows = self.connection.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        except sqlite3.Error:
+            rows = []  # statements that have no plan
+        plan = [row[3] for row in rows]
+        self.plans[query] = plan
+        log.debug("Plan of %s: %s", query_name(query), "; ".join(plan))
+        scans = self.scanned_tables(query, plan)
+        if scans:
+            log.warning("Full scan of %s: %s", ", ".join(scans), query_name(query))
+
+    def scanned_tables(self, query, plan):
+        """Tables a filtered query reads in full; listing a whole table is fine."""
+        if "WHERE" not in query.upper():
+            return []
+        # subqueries are scanned by their name too
+        subqueries = {
+            detail.split()[-1]
+            for detail in plan
+            if detail.startswith(("MATERIALIZE", "CO-ROUTINE"))
+        }
+        scans = [match[1] for match in map(FULL_SCAN.match, plan) if match]
+        return [table for table in scans if table not in subqueries and table != "sqlite_master"]
+
+    def full_scans(self):
+        """Queries explained so far that scan a whole table."""
+        return {
+            query: plan
+            for query, plan in list(self.plans.items())
+            if self.scanned_tables(query, plan)
+        }
+
     def execute(self, query, params=()):
         if not self.connection:
             print("No database connection established")
             return
 
         try:
+            if self.explain:
+                self.explain_query(query, params)
+            start = perf_counter()
             self.cursor.execute(query, params)
-            self.connection.commit()
+            self.commit()
+            timings().add(query_name(query), perf_counter() - start, self.cursor.rowcount)
             return self.cursor.lastrowid
         except sqlite3.Error as e:
+            if self.transaction_depth:
+                raise
             self.connection.rollback()
             print(f"Error executing query: {e}\nQuery: {query}")
+            log.error("Error executing query: %s; %s", e, query_name(query))
 
     def executemany(self, query, params=()):
         if not self.connection:
@@ -71,37 +374,255 @@ class Database:
             return
 
         try:
+            if self.explain and isinstance(params, list) and params:
+                self.explain_query(query, params[0])
+            start = perf_counter()
             self.cursor.executemany(query, params)
-            self.connection.commit()
+            self.commit()
+            timings().add(query_name(query), perf_counter() - start, self.cursor.rowcount)
             return self.cursor.rowcount
         except sqlite3.Error as e:
+            if self.transaction_depth:
+                raise
             self.connection.rollback()
             print(f"Error executing query: {e}\nQuery: {query}")
+            log.error("Error executing query: %s; %s", e, query_name(query))
 
     def fetch_all(self, query, params=()):
         if not self.connection:
             print("No database connection established")
 
         try:
+            if self.explain:
+                self.explain_query(query, params)
+            start = perf_counter()
             self.cursor.execute(query, params)
-            return self.cursor.fetchall()
+            rows = self.cursor.fetchall()
+            timings().add(query_name(query), perf_counter() - start, len(rows))
+            return rows
         except sqlite3.Error as e:
+            if self.transaction_depth:
+                raise
             print(f"Error fetching data: {e}\nQuery: {query}")
+            log.error("Error fetching data: %s; %s", e, query_name(query))
+
+    def migrate(self, migrations):
+        """Apply the migrations the database has not seen, all in one transaction.
+
+        `PRAGMA user_version` is the number of applied migrations, so an up
+        to date database costs a single pragma read.
+        """
+        version = self.fetch_one(""" PRAGMA user_version; """)[0]
+        if version >= len(migrations):
+            if version > len(migrations):
+                print(f"Database version {version} is newer than the app ({len(migrations)}).")
+            return version
+
+        with self.transaction():
+            for number, migration in enumerate(migrations[version:], start=version + 1):
+                migration(self)
+                print(f"Migration {number} applied: {migration.__doc__}")
+            self.execute(f""" PRAGMA user_version = {len(migrations)}; """)
+        # the transaction rolls back a failed migration, leaving the old version
+        version = self.fetch_one(""" PRAGMA user_version; """)[0]
+        if version < len(migrations):
+            raise MigrationError(f"Database is at migration {version} of {len(migrations)}")
+        return version
 
     def fetch_one(self, query, params=()):
         if not self.connection:
             print("No database connection established")
 
         try:
+            if self.explain:
+                self.explain_query(query, params)
+            start = perf_counter()
             self.cursor.execute(query, params)
-            return self.cursor.fetchone()
+            rows = self.cursor.fetchone()
+            timings().add(query_name(query), perf_counter() - start, int(rows is not None))
+            return rows
         except sqlite3.Error as e:
+            if self.transaction_depth:
+                raise
             print(f"Error fetching data: {e}\nQuery: {query}")
+            log.error("Error fetching data: %s; %s", e, query_name(query))
+
+
+# ==================
+# -- Migrations --
+# ==================
+# Schema changes of forms.db in order; never edit or reorder an applied one,
+# add a new function to the end of MIGRATIONS instead.
+def add_lookup_indexes(db):
+    """Indexes of the columns schemas, form ids and options are looked up by."""
+    db.execute(""" CREATE INDEX IF NOT EXISTS fields_form_id_index ON fields(form_id); """)
+    db.execute(""" CREATE INDEX IF NOT EXISTS fields_option_id_index ON fields(option_id); """)
+    db.execute(""" CREATE INDEX IF NOT EXISTS forms_name_index ON forms(name); """)
+    db.execute(""" CREATE INDEX IF NOT EXISTS options_option_id_index ON options(option_id); """)
+
+
+def remove_deleted_form_leftovers(db):
+    """Fields and records tables left behind by forms deleted before."""
+    db.execute(""" DELETE FROM fields WHERE form_id NOT IN (SELECT id FROM forms); """)
+    sql = """ SELECT name FROM sqlite_master
+              WHERE type = 'table' AND name LIKE 'records\\_%' ESCAPE '\\'; """
+    form_ids = {row[0] for row in db.fetch_all(""" SELECT id FROM forms; """)}
+    for (table,) in db.fetch_all(sql):
+        form_id = table.removeprefix("records_")
+        if form_id.isdigit() and int(form_id) not in form_ids:
+            db.execute(f""" DROP TABLE "{table}"; """)
+    tables = {row[0] for row in db.fetch_all(""" SELECT name FROM sqlite_master; """)}
+    for table in ("record_search", "report_rollups"):
+        if table in tables:
+            db.execute(f""" DELETE FROM {table} WHERE form_id NOT IN (SELECT id FROM forms); """)
+
+
+def add_journal_clients(db):
+    """Last journal entry written to the records, for every desktop journal."""
+    db.execute(""" CREATE TABLE journal_clients (
+                       client TEXT PRIMARY KEY,
+                       applied INTEGER NOT NULL); """)
+
+
+def add_record_changes(db):
+    """Log of changed records, for the views of other desktops."""
+    db.execute(""" CREATE TABLE record_changes (
+                       id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       form_id INTEGER NOT NULL,
+                       record_id INTEGER NOT NULL); """)
+    db.execute(""" CREATE INDEX record_changes_form_index ON record_changes(form_id, id); """)
+
+
+def add_rollup_counts_index(db):
+    """Index of the record counts in the rollups, for the report years and form counts."""
+    if db.fetch_one(""" SELECT 1 FROM sqlite_master WHERE name = 'report_rollups'; """):
+        db.execute(ROLLUP_COUNTS_INDEX)
+
+
+def add_schema_version(db):
+    """Counter of the changes of forms and options, for the schema caches of other desktops."""
+    db.execute(""" CREATE TABLE schema_version (
+                       id INTEGER PRIMARY KEY CHECK (id = 1),
+                       version INTEGER NOT NULL); """)
+    db.execute(""" INSERT INTO schema_version VALUES (1, 0); """)
+
+
+# record counts are the field_id 0 rows; covers the queries of all the forms
+ROLLUP_COUNTS_INDEX = """ CREATE INDEX IF NOT EXISTS report_rollups_counts_index
+                          ON report_rollups(field_id, year, form_id, month, count); """
+
+MIGRATIONS = (
+    add_lookup_indexes,
+    remove_deleted_form_leftovers,
+    add_journal_clients,
+    add_record_changes,
+    add_rollup_counts_index,
+    add_schema_version,
+)
+
+
+class MigrationError(Exception):
+    """forms.db could not be brought up to date; the app must not run on it."""
+
+
+# Field of a form; options are set for multi choice fields.
+Field = namedtuple(
+    "Field", ["name", "type", "id", "option_id", "options"], defaults=(None, None, ())
+)
+
+
+class FormSchema:
+    """A form with its fields and the options of its multi choice fields.
+
+    A schema is loaded with a single query and cached until a form or an
+    option changes; models that change them call `FormSchema.changed()`,
+    which counts the change in schema_version for the other desktops.
+    """
+
+    cache = {}  # form id -> FormSchema
+    names = {}  # form name -> form id
+    version = None  # schema_version the cache belongs to
+    data_versions = {}  # thread id -> PRAGMA data_version of its connection at the last check
+
+    def __init__(self, form_id, name, fields):
+        self.id = form_id
+        self.name = name
+        self.fields = fields
+
+    @classmethod
+    def load(cls, db, form_id):
+        cls.refresh(db)
+        if form_id not in cls.cache:
+            cls.query(db, "forms.id = ?", form_id)
+        return cls.cache.get(form_id)
+
+    @classmethod
+    def load_by_name(cls, db, name):
+        cls.refresh(db)
+        if name not in cls.names:
+            # first form with the name like DataModel.get_form_id
+            cls.query(db, "forms.id = (SELECT id FROM forms WHERE name = ? LIMIT 1)", name)
+        return cls.cache.get(cls.names.get(name))
+
+    @classmethod
+    def query(cls, db, where, param):
+        sql = f""" SELECT forms.id, forms.name,
+                          fields.id, fields.name, fields.type, fields.option_id, options.name
+                   FROM forms
+                   LEFT JOIN fields ON fields.form_id = forms.id
+                   LEFT JOIN options ON options.option_id = fields.option_id
+                                    AND fields.type = ?
+                   WHERE {where}
+                   ORDER BY fields.id, options.id; """
+        rows = db.fetch_all(sql, ("چند گزینه", param))
+        if not rows:
+            return None
+
+        fields = {}
+        for *_, field_id, name, ftype, option_id, option in rows:
+            if field_id is None:  # form without fields
+                continue
+            if field_id not in fields:
+                fields[field_id] = Field(name, ftype, field_id, option_id, [])
+            if option is not None:
+                fields[field_id].options.append(option)
+
+        form_id, form_name = rows[0][:2]
+        schema = cls(form_id, form_name, list(fields.values()))
+        cls.cache[form_id] = schema
+        cls.names.setdefault(form_name, form_id)
+        return schema
+
+    @classmethod
+    def refresh(cls, db):
+        """Drop the cache if another connection, maybe of another desktop, changed a form."""
+        # data_version moves only when another connection commits
+        data_version = db.fetch_one(""" PRAGMA data_version; """)
+        if cls.data_versions.get(threading.get_ident()) == data_version:
+            return
+        version = db.fetch_one(""" SELECT version FROM schema_version; """)
+        if version != cls.version:
+            cls.invalidate()
+            cls.version = version
+        cls.data_versions[threading.get_ident()] = data_version
+
+    @classmethod
+    def changed(cls, db):
+        """Count a change of forms or options; in the transaction of the change."""
+        db.execute(""" UPDATE schema_version SET version = version + 1; """)
+        cls.invalidate()
+
+    @classmethod
+    def invalidate(cls):
+        cls.cache.clear()
+        cls.names.clear()
+        cls.version = None
+        cls.data_versions.clear()
 
 
 class FormModel:
     def __init__(self):
-        self.db = Database("forms.db")
+        self.db = Database.open("forms.db")
 
     def field_types(self):
         sql = """ SELECT name FROM types; """
@@ -109,14 +630,17 @@ class FormModel:
         return [value for item in types for value in item]
 
     def save_form(self, name, rows):
-        # Save table name - form name
-        sql = """INSERT INTO forms(name) VALUES (?)"""
-        tid = self.db.execute(sql, (name,))
-
-        sql = """ INSERT INTO fields (name, type, option_id, form_id) VALUES (?, ?, ?, ?)"""
-        rows = [(*row, tid) for row in rows]
-        self.db.executemany(sql, rows)
-        print(f"Table {name} with id {tid} stored with fields succussfully.")
+        with self.db.transaction():
+            # Save table name - form name
+            sql = """INSERT INTO forms(name) VALUES (?)"""
+            tid = self.db.execute(sql, (name,))
+
+            sql = """ INSERT INTO fields (name, type, option_id, form_id) VALUES (?, ?, ?, ?)"""
+            rows = [(*row, tid) for row in rows]
+            self.db.executemany(sql, rows)
+            FormSchema.changed(self.db)
+            print(f"Table {name} with id {tid} stored with fields succussfully.")
+            return tid
 
     def get_form_names(self):
         sql = """ SELECT name FROM forms; """
@@ -143,6 +667,7 @@ class FormModel:
     def update_form_name(self, fid, new_name):
         sql = """ UPDATE forms SET name = ? WHERE id = ?;"""
         self.db.execute(sql, (new_name, fid))
+        FormSchema.changed(self.db)
         print("form name updated successfuly.")
         return True
 
@@ -151,21 +676,52 @@ class FormModel:
                   SET name = ?, type = ?
                   WHERE id = ?;"""
         self.db.executemany(sql, fields)
+        FormSchema.changed(self.db)
         print("form name updated successfuly.")
         return True
 
-    def delete_form(self, fid):
-        sql = """ DELETE FROM forms
-                  WHERE id = ?;
-                  """
-        self.db.execute(sql, (fid,))
+    def update_form(self, fid, new_name, fields):
+        """Update form name and its fields together."""
+        with self.db.transaction():
+            self.update_form_name(fid, new_name)
+            self.update_form_fields(fields)
+            # field types decide what the report rolls up
+            if RecordModel().table_exists(fid):
+                RecordModel().rebuild_rollups(fid)
+            return True
+
+    def delete_form(self, fid, data_dir=None):
+        """Delete a form with its fields, records and the option sets only it used.
+
+        Old `data/<fid>.csv` files of the form are removed too.
+        """
+        deleted = False
+        with self.db.transaction():
+            sql = """ SELECT DISTINCT option_id FROM fields
+                      WHERE form_id = ? AND option_id IS NOT NULL; """
+            option_ids = [row[0] for row in self.db.fetch_all(sql, (fid,))]
+            RecordModel().drop_records(fid)
+            self.db.execute(""" DELETE FROM fields WHERE form_id = ?; """, (fid,))
+            self.db.execute(""" DELETE FROM forms WHERE id = ?; """, (fid,))
+            # option sets no other form has a field of
+            sql = """ SELECT 1 FROM fields WHERE option_id = ? LIMIT 1; """
+            orphans = [(id_,) for id_ in option_ids if self.db.fetch_one(sql, (id_,)) is None]
+            self.db.executemany(""" DELETE FROM options WHERE option_id = ?; """, orphans)
+            self.db.executemany(""" DELETE FROM option WHERE id = ?; """, orphans)
+            FormSchema.changed(self.db)
+            deleted = True
+
+        if not deleted:
+            return False
+        for csv_file in Path(data_dir or DATA_DIR).glob(f"{int(fid)}.csv*"):
+            csv_file.unlink()
         print(f"Table with id {fid} deleted successfuly.")
         return True
 
 
 class DataModel:
     def __init__(self):
-        self.db = Database("forms.db")
+        self.db = Database.open("forms.db")
 
     def get_form_names(self):
         sql = """ SELECT name FROM forms; """
@@ -191,10 +747,11 @@ class DataModel:
         # Field name and field type
         return [(field[1], field[2]) for field in fields]
 
-    def get_field_option_id(self, form_id):
-        sql = """ SELECT option_id FROM fields WHERE form_id = (?) AND type = "چند گزینه" ; """
-        options_ids = self.db.fetch_all(sql, (form_id,))
-        return options_ids
+    def get_schema(self, form_id):
+        return FormSchema.load(self.db, form_id)
+
+    def get_schema_by_name(self, name):
+        return FormSchema.load_by_name(self.db, name)
 
     def get_options(self, option_id):
         sql = """SELECT name FROM options WHERE option_id = ?;"""
@@ -204,7 +761,7 @@ class DataModel:
 
 class OptionModel:
     def __init__(self):
-        self.db = Database("forms.db")
+        self.db = Database.open("forms.db")
 
     def save_option(self, option_name):
         sql = """ INSERT INTO option (name) VALUES (?);"""
@@ -214,28 +771,1017 @@ class OptionModel:
     def save_options(self, options):
         sql = """ INSERT INTO options (option_id, name) VALUES (?, ?);"""
         self.db.executemany(sql, options)
+        FormSchema.changed(self.db)
         return True
 
+    def save_multichoice(self, option_name, names):
+        """Save a multi choice and its options together."""
+        with self.db.transaction():
+            option_id = self.save_option(option_name)
+            self.save_options([(option_id, name) for name in names])
+            return option_id
+
     def get_options(self):
         sql = """ SELECT * FROM option;"""
         options = self.db.fetch_all(sql)
         return options
 
 
+class RecordModel:
+    """Records of user forms.
+
+    Every form gets its own `records_<form_id>` table with an integer
+    primary key and one column per field (`f_<field_id>`), so a single
+    record can be inserted, updated or deleted without touching the rest.
+    """
+
+    RANKED_MATCHES = 10000  # search results are ranked up to this many matches
+    VERSION = "INTEGER NOT NULL DEFAULT 0"
+    KEEP_CHANGES = 100000  # rows of record_changes kept for other desktops
+    PRUNE_CHANGES = 10000  # the log is pruned every time this many rows are added
+    synced = {}  # records table -> schema it is known to be in sync with; of all the models
+
+    def __init__(self):
+        self.db = Database.open("forms.db")
+        self.tables = {}  # derived table -> True once it is known to exist
+
+    def table_name(self, form_id):
+        return f"records_{int(form_id)}"
+
+    def get_fields(self, form_id):
+        schema = FormSchema.load(self.db, form_id)
+        if schema is None:
+            return []
+        return [(field.id, field.name, field.type) for field in schema.fields]
+
+    def get_columns(self, form_id):
+        return [f"f_{field[0]}" for field in self.get_fields(form_id)]
+
+    def get_header(self, form_id):
+        return [field[1] for field in self.get_fields(form_id)]
+
+    def table_exists(self, form_id):
+        return self.has_table(self.table_name(form_id))
+
+    def column_type(self, field_type):
+        return COLUMN_TYPES.get(field_type, "TEXT")
+
+    def create_table(self, form_id):
+        """Create the records table of a form or bring it in line with the
+        fields: add columns of new fields, convert columns of changed types."""
+        table = self.table_name(form_id)
+        schema = FormSchema.load(self.db, form_id)
+        if schema is None:  # deleted; maybe by another model or desktop
+            self.synced.pop(table, None)
+            raise ValueError(f"No form {form_id}")
+        if self.synced.get(table) is schema:
+            return table
+
+        fields = self.get_fields(form_id)
+        # a table in sync is only read; the write lock is for creating or changing it
+        if self.in_sync(table, fields):
+            self.synced[table] = schema
+            return table
+
+        # version counts the updates of a record; see update_record
+        definitions = ['"id" INTEGER PRIMARY KEY AUTOINCREMENT', f'"version" {self.VERSION}']
+        definitions += [f'"f_{field[0]}" {self.column_type(field[2])}' for field in fields]
+        with self.db.transaction():
+            sql = f""" CREATE TABLE IF NOT EXISTS "{table}" ({", ".join(definitions)}); """
+            self.db.execute(sql)
+
+            info = self.db.fetch_all(f'PRAGMA table_info("{table}");')
+            column_types = {row[1]: row[2] for row in info}
+            if "version" not in column_types:
+                self.db.execute(f'ALTER TABLE "{table}" ADD COLUMN "version" {self.VERSION};')
+            for field_id, _, field_type in fields:
+                column = f"f_{field_id}"
+                column_type = self.column_type(field_type)
+                if column not in column_types:
+                    self.db.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {column_type};')
+                elif column_types[column] != column_type:
+                    self.convert_table(form_id, definitions, column_types)
+                    break
+
+            self.synced[table] = schema
+        return table
+
+    def in_sync(self, table, fields):
+        """Whether the table exists with a column of the right type for every field."""
+        info = self.db.fetch_all(f'PRAGMA table_info("{table}");') or []
+        column_types = {row[1]: row[2] for row in info}
+        return "version" in column_types and all(
+            column_types.get(f"f_{field_id}") == self.column_type(field_type)
+            for field_id, _, field_type in fields
+        )
+
+    def convert_table(self, form_id, definitions, column_types):
+        """Copy the records to a table of the current column types.
+
+        Values are converted to their field type; the ones that don't fit
+        are kept as text. Indexes, search index and rollups are rebuilt.
+        """
+        table = self.table_name(form_id)
+        schema = FormSchema.load(self.db, form_id)
+        indexed = self.get_indexed_fields(form_id)
+        old_columns = [column for column in column_types if column not in ("id", "version")]
+        columns = [f"f_{field.id}" for field in schema.fields]
+        self.db.execute(f""" CREATE TABLE "{table}_new" ({", ".join(definitions)}); """)
+
+        names = ", ".join(f'"{column}"' for column in ["id", *columns])
+        marks = ", ".join("?" for _ in ["id", *columns])
+        insert = f""" INSERT INTO "{table}_new" ({names}) VALUES ({marks}); """
+        select = f""" SELECT {", ".join(f'"{c}"' for c in ["id", *old_columns])} FROM "{table}"
+                      WHERE id > ? ORDER BY id LIMIT 5000; """
+        after_id = 0
+        while page := self.db.fetch_all(select, (after_id,)):
+            rows = []
+            for record in page:
+                values = dict(zip(old_columns, record[1:]))
+                converted = [
+                    convert_value(field, values.get(column), column_types.get(column))
+                    for field, column in zip(schema.fields, columns)
+                ]
+                rows.append([record[0], *converted])
+            self.db.executemany(insert, rows)
+            after_id = page[-1][0]
+
+        sql = """ SELECT seq FROM sqlite_sequence WHERE name = ?; """
+        sequence = self.db.fetch_one(sql, (table,))
+        self.db.execute(f""" DROP TABLE "{table}"; """)
+        self.db.execute(f""" ALTER TABLE "{table}_new" RENAME TO "{table}"; """)
+        if sequence:  # keep ids of deleted records unused
+            sql = """ UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?; """
+            self.db.execute(sql, (sequence[0], table))
+        for field_id in indexed & {field.id for field in schema.fields}:
+            name = self.index_name(form_id, field_id)
+            self.db.execute(f""" CREATE INDEX "{name}" ON "{table}" ("f_{field_id}"); """)
+        print(f"Records of form {form_id} converted to the types of its fields.")
+
+        self.synced[table] = schema
+        if self.has_table("record_search"):
+            self.db.execute(""" DELETE FROM record_search WHERE form_id = ?; """, (form_id,))
+            after_id = 0
+            while page := self.get_records_page(form_id, after_id, 5000):
+                self.index_records(form_id, page)
+                after_id = page[-1][0]
+        if self.has_table("report_rollups"):
+            self.rebuild_rollups(form_id)
+
+    def has_table(self, name):
+        sql = """ SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?; """
+        return self.db.fetch_one(sql, (name,)) is not None
+
+    def create_tables(self):
+        """Bring the records tables of all forms in line with their fields."""
+        for form_id, _ in self.get_forms_with_tables():
+            self.create_table(form_id)
+
+    def get_forms_with_tables(self):
+        """(id, name) of forms that have a records table."""
+        sql = """ SELECT name FROM sqlite_master
+                  WHERE type = 'table' AND name LIKE 'records\\_%' ESCAPE '\\'; """
+        tables = {row[0] for row in self.db.fetch_all(sql)}
+        forms = self.db.fetch_all(""" SELECT id, name FROM forms; """)
+        return [form for form in forms if self.table_name(form[0]) in tables]
+
+    def get_forms_with_records(self):
+        """(id, name) of forms that have records."""
+        self.create_record_counts()
+        sql = """ SELECT forms.id, forms.name FROM record_counts
+                  JOIN forms ON forms.id = record_counts.form_id
+                  WHERE record_counts.count > 0
+                  ORDER BY forms.id; """
+        return self.db.fetch_all(sql) or []
+
+    def get_records(self, form_id):
+        """All records of a form as (id, value1, value2, ...) tuples."""
+        if not self.table_exists(form_id):
+            return []
+        table = self.create_table(form_id)
+        columns = ", ".join(f'"{column}"' for column in self.get_columns(form_id))
+        sql = f""" SELECT id, {columns} FROM "{table}" ORDER BY id; """
+        return self.db.fetch_all(sql) or []
+
+    def get_records_page(self, form_id, after_id=0, limit=500):
+        """Up to `limit` records with an id greater than `after_id`."""
+        return self.find_records(form_id, after_id=after_id, limit=limit)
+
+    def filter_clause(self, field_id, field_type, operator, value):
+        """SQL condition and params of a (field_id, operator, value) filter."""
+        column = f'"f_{field_id}"'
+        field = Field("", field_type)
+        if operator == "contains":
+            # dates are stored as 14040214; a month name has to become its digits
+            if field_type == "تاریخ شمسی" and (pattern := shamsi_date_pattern(value)):
+                return f"{column} LIKE ?", [pattern]
+            if field_type in COLUMN_TYPES:  # stored as latin digits
+                value = value.translate(LATIN_DIGITS).replace("-", "").replace(",", "")
+            escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            return f"{column} LIKE ? ESCAPE '\\'", [f"%{escaped}%"]
+
+        if operator == "equals":
+            parsed = parse_value(field, value)
+            return f"{column} = ?", [value if parsed is None else parsed]
+
+        if operator == "between" and field_type in RANGE_TYPES:
+            clauses, params = [], []
+            low, high = (parse_value(field, bound) for bound in value)
+            if low is not None:
+                clauses.append(f"{column} >= ?")
+                params.append(low)
+            if high is not None:
+                clauses.append(f"{column} <= ?")
+                params.append(high)
+            return " AND ".join(clauses) or "1", params
+        raise ValueError(f"Unknown filter {operator} on {field_type}")
+
+    def find_records(self, form_id, filters=(), sort_by=None, after_id=0, offset=0, limit=500):
+        """A page of records matching all the filters.
+
+        filters: (field_id, operator, value) with operator contains, equals
+            or between; value of between is a (low, high) pair.
+        sort_by: (field_id, descending) or None for id order. Pages in id
+            order start after `after_id`; sorted pages start at `offset`.
+        """
+        if not self.table_exists(form_id):
+            return []
+        table = self.create_table(form_id)
+        types = {field[0]: field[2] for field in self.get_fields(form_id)}
+        columns = ", ".join(f'"{column}"' for column in self.get_columns(form_id))
+
+        clauses, params = [], []
+        for field_id, operator, value in filters:
+            if field_id not in types:
+                continue  # field removed from the form
+            clause, clause_params = self.filter_clause(field_id, types[field_id], operator, value)
+            clauses.append(clause)
+            params += clause_params
+
+        if sort_by and sort_by[0] in types:
+            field_id, descending = sort_by
+            order = f""""f_{field_id}" {'DESC' if descending else 'ASC'}, id"""
+            limits = "LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        else:
+            clauses.append("id > ?")
+            order = "id"
+            limits = "LIMIT ?"
+            params += [after_id, limit]
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f""" SELECT id, {columns} FROM "{table}" {where} ORDER BY {order} {limits}; """
+        return self.db.fetch_all(sql, params) or []
+
+    def index_name(self, form_id, field_id):
+        return f"{self.table_name(form_id)}_f_{int(field_id)}_index"
+
+    def get_indexed_fields(self, form_id):
+        """Ids of the fields that have an index."""
+        sql = """ SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?; """
+        pattern = self.index_name(form_id, 0).replace("_0_", r"_(\d+)_")
+        names = [row[0] for row in self.db.fetch_all(sql, (self.table_name(form_id),)) or []]
+        return {int(match[1]) for name in names if (match := re.fullmatch(pattern, name))}
+
+    def create_index(self, form_id, field_id):
+        """Index a field for fast equals, range filters and sort."""
+        table = self.create_table(form_id)
+        name = self.index_name(form_id, field_id)
+        sql = f""" CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ("f_{field_id}"); """
+        self.db.execute(sql)
+        return field_id in self.get_indexed_fields(form_id)
+
+    def drop_index(self, form_id, field_id):
+        self.db.execute(f""" DROP INDEX IF EXISTS "{self.index_name(form_id, field_id)}"; """)
+        return field_id not in self.get_indexed_fields(form_id)
+
+    def count_records(self, form_id):
+        self.create_record_counts()
+        sql = """ SELECT count FROM record_counts WHERE form_id = ?; """
+        row = self.db.fetch_one(sql, (int(form_id),))
+        return row[0] if row else 0
+
+    def iter_records(self, form_id, page_size=500):
+        """Yield all records of a form, reading a page at a time."""
+        after_id = 0
+        while page := self.get_records_page(form_id, after_id, page_size):
+            yield from page
+            after_id = page[-1][0]
+
+    def _fit(self, form_id, row):
+        """Pad or cut row values to the number of form fields."""
+        size = len(self.get_columns(form_id))
+        row = list(row)[:size]
+        return row + [None] * (size - len(row))
+
+    def insert_record(self, form_id, row):
+        table = self.create_table(form_id)
+        columns = self.get_columns(form_id)
+        names = ", ".join(f'"{column}"' for column in columns)
+        marks = ", ".join("?" for _ in columns)
+        sql = f""" INSERT INTO "{table}" ({names}) VALUES ({marks}); """
+        row = self._fit(form_id, row)
+        self.create_derived_tables()
+        with self.db.transaction():
+            record_id = self.db.execute(sql, row)
+            self.records_added(form_id, [(record_id, *row)])
+            return record_id
+
+    def insert_records(self, form_id, rows):
+        table = self.create_table(form_id)
+        columns = self.get_columns(form_id)
+        names = ", ".join(f'"{column}"' for column in columns)
+        marks = ", ".join("?" for _ in columns)
+        sql = f""" INSERT INTO "{table}" ({names}) VALUES ({marks}); """
+        self.create_derived_tables()
+        with self.db.transaction():
+            last_id = self.db.fetch_one(f""" SELECT COALESCE(MAX(id), 0) FROM "{table}"; """)[0]
+            count = self.db.executemany(sql, [self._fit(form_id, row) for row in rows])
+            self.records_added(form_id, self.find_records(form_id, after_id=last_id, limit=-1))
+            return count
+
+    def get_version(self, form_id, record_id):
+        """Version of a record; None if it is deleted."""
+        if not self.table_exists(form_id):
+            return None
+        table = self.create_table(form_id)
+        row = self.db.fetch_one(f""" SELECT version FROM "{table}" WHERE id = ?; """, (record_id,))
+        return row and row[0]
+
+    def update_record(self, form_id, record_id, row, version=None):
+        """Update a record; with a version, only if nobody changed it since.
+
+        False if the record has another version, or is deleted.
+        """
+        table = self.create_table(form_id)
+        assignments = ", ".join(f'"{column}" = ?' for column in self.get_columns(form_id))
+        sql = f""" UPDATE "{table}" SET {assignments}, version = version + 1 WHERE id = ?; """
+        row = self._fit(form_id, row)
+        self.create_derived_tables()
+        with self.db.transaction():
+            # the write lock is held, nobody can change it between check and update
+            if version is not None and self.get_version(form_id, record_id) != version:
+                return False
+            self.records_removed(form_id, self.get_records_by_ids(form_id, [record_id]))
+            self.db.execute(sql, (*row, record_id))
+            self.records_added(form_id, [(record_id, *row)])
+            return True
+
+    def delete_record(self, form_id, record_id):
+        return self.delete_records(form_id, [record_id])
+
+    def delete_records(self, form_id, record_ids):
+        """Delete several records in one transaction."""
+        table = self.create_table(form_id)
+        sql = f""" DELETE FROM "{table}" WHERE id = ?; """
+        self.create_derived_tables()
+        with self.db.transaction():
+            self.records_removed(form_id, self.get_records_by_ids(form_id, record_ids))
+            self.db.executemany(sql, [(record_id,) for record_id in record_ids])
+            return True
+
+    def drop_records(self, form_id):
+        """Remove the records of a form with their search rows and rollups."""
+        with self.db.transaction():
+            if self.has_table("record_search"):
+                first, last = self.search_rowid(form_id, 0), self.search_rowid(form_id, 2**32 - 1)
+                sql = """ DELETE FROM record_search WHERE rowid BETWEEN ? AND ?; """
+                self.db.execute(sql, (first, last))
+            if self.has_table("report_rollups"):
+                sql = """ DELETE FROM report_rollups WHERE form_id = ?; """
+                self.db.execute(sql, (int(form_id),))
+            if self.has_table("record_counts"):
+                sql = """ DELETE FROM record_counts WHERE form_id = ?; """
+                self.db.execute(sql, (int(form_id),))
+            sql = """ DELETE FROM record_changes WHERE form_id = ?; """
+            self.db.execute(sql, (int(form_id),))
+            # indexes of the table and its sqlite_sequence row go with it
+            self.db.execute(f""" DROP TABLE IF EXISTS "{self.table_name(form_id)}"; """)
+            self.synced.pop(self.table_name(form_id), None)
+            return True
+
+    def compact(self, min_free=0.25):
+        """Give the space of deleted rows back when a good part of the file is free.
+
+        VACUUM rewrites the whole file, so it only runs past min_free.
+        """
+        page_count = self.db.fetch_one(""" PRAGMA page_count; """)[0]
+        free_pages = self.db.fetch_one(""" PRAGMA freelist_count; """)[0]
+        if free_pages < page_count * min_free:
+            return False
+        if self.has_table("record_search"):
+            # merge the search index segments left by deleted rows
+            self.db.execute(""" INSERT INTO record_search(record_search) VALUES ('optimize'); """)
+        self.db.execute(""" VACUUM; """)
+        self.db.execute(""" PRAGMA wal_checkpoint(TRUNCATE); """)
+        print(f"Database compacted: {free_pages} of {page_count} pages were free.")
+        return True
+
+    def get_records_by_ids(self, form_id, record_ids, chunk_size=500):
+        table = self.create_table(form_id)
+        columns = ", ".join(f'"{column}"' for column in self.get_columns(form_id))
+        record_ids = list(record_ids)
+        records = []
+        for start in range(0, len(record_ids), chunk_size):
+            chunk = record_ids[start : start + chunk_size]
+            marks = ", ".join("?" for _ in chunk)
+            sql = f""" SELECT id, {columns} FROM "{table}" WHERE id IN ({marks}); """
+            records += self.db.fetch_all(sql, chunk) or []
+        return records
+
+    # Tables derived from the records: the search index and the report
+    # rollups. Both are updated in the same transaction as the records.
+    def create_derived_tables(self):
+        self.create_record_counts()
+        self.create_search_index()
+        self.create_rollups()
+
+    def records_added(self, form_id, records):
+        """Add (id, value1, value2, ...) records to the derived tables."""
+        self.log_changes(form_id, [record[0] for record in records])
+        self.update_count(form_id, len(records))
+        self.index_records(form_id, records)
+        self.roll_up(form_id, records, 1)
+
+    def records_removed(self, form_id, records):
+        """Remove records, as they were before the change, from the derived tables."""
+        self.log_changes(form_id, [record[0] for record in records])
+        self.update_count(form_id, -len(records))
+        self.unindex_records(form_id, [record[0] for record in records])
+        self.roll_up(form_id, records, -1)
+
+    # In shared mode changed records are logged so the views of other
+    # desktops can show them; a view polls the log for its form and
+    # reloads only those records.
+    def log_changes(self, form_id, record_ids):
+        if not self.db.shared:
+            return
+        rows = [(int(form_id), record_id) for record_id in record_ids]
+        sql = """ INSERT INTO record_changes (form_id, record_id) VALUES (?, ?); """
+        self.db.executemany(sql, rows)
+        last = self.last_change()
+        if last // self.PRUNE_CHANGES > (last - len(rows)) // self.PRUNE_CHANGES:
+            self.prune_changes()
+
+    def last_change(self):
+        return self.db.fetch_one(""" SELECT COALESCE(MAX(id), 0) FROM record_changes; """)[0]
+
+    def get_changes(self, form_id, after_change):
+        """Records of a form changed after a change; (last change, records, deleted ids).
+
+        None if the log is pruned past after_change; reload the form then.
+        """
+        first = self.db.fetch_one(""" SELECT MIN(id) FROM record_changes; """)[0]
+        if first is not None and first > after_change + 1:
+            return None
+        sql = """ SELECT id, record_id FROM record_changes WHERE form_id = ? AND id > ?; """
+        changes = self.db.fetch_all(sql, (int(form_id), after_change))
+        if not changes:
+            return after_change, [], []
+        record_ids = sorted({change[1] for change in changes})
+        records = self.get_records_by_ids(form_id, record_ids)
+        deleted = sorted(set(record_ids) - {record[0] for record in records})
+        return max(change[0] for change in changes), records, deleted
+
+    def prune_changes(self):
+        sql = """ DELETE FROM record_changes
+                  WHERE id <= (SELECT MAX(id) FROM record_changes) - ?; """
+        self.db.execute(sql, (self.KEEP_CHANGES,))
+
+    # Number of records of each form, so listing the forms that have data
+    # and counting records of a form are single indexed lookups.
+    def create_record_counts(self):
+        """Create the record_counts table; filled from existing records once."""
+        if "record_counts" in self.tables:
+            return
+        if not self.has_table("record_counts"):
+            with self.db.transaction():
+                self.db.execute(""" CREATE TABLE record_counts (
+                                        form_id INTEGER PRIMARY KEY,
+                                        count INTEGER NOT NULL); """)
+                for form_id, _ in self.get_forms_with_tables():
+                    table = self.table_name(form_id)
+                    sql = f""" INSERT INTO record_counts SELECT ?, COUNT(*) FROM "{table}"; """
+                    self.db.execute(sql, (form_id,))
+                print("Record counts created.")
+            if not self.has_table("record_counts"):
+                return  # rolled back
+        self.tables["record_counts"] = True
+
+    def update_count(self, form_id, change):
+        sql = """ INSERT INTO record_counts (form_id, count) VALUES (?, ?)
+                  ON CONFLICT (form_id) DO UPDATE SET count = count + excluded.count; """
+        self.db.execute(sql, (int(form_id), change))
+
+    # Full text search over the records of all forms. Each record is a
+    # row of the record_search fts5 table, kept in sync by the methods
+    # above in the same transaction as the record itself.
+    def search_rowid(self, form_id, record_id):
+        return (int(form_id) << 32) | int(record_id)
+
+    def create_search_index(self):
+        """Create the search table; filled from existing records once."""
+        if "record_search" in self.tables:
+            return
+        if not self.has_table("record_search"):
+            self.create_tables()
+            with self.db.transaction():
+                self.db.execute(""" CREATE VIRTUAL TABLE record_search USING fts5(
+                                        text, form_id UNINDEXED, record_id UNINDEXED,
+                                        tokenize = 'unicode61'); """)
+                for form_id, _ in self.get_forms_with_tables():
+                    after_id = 0
+                    while page := self.get_records_page(form_id, after_id, 5000):
+                        self.index_records(form_id, page)
+                        after_id = page[-1][0]
+                print("Search index created.")
+            if not self.has_table("record_search"):
+                return  # rolled back
+        self.tables["record_search"] = True
+
+    def index_records(self, form_id, records):
+        """Add (id, value1, value2, ...) records to the search table."""
+        sql = """ INSERT INTO record_search (rowid, text, form_id, record_id)
+                  VALUES (?, ?, ?, ?); """
+        types = [field[2] for field in self.get_fields(form_id)]
+        rows = (
+            (
+                self.search_rowid(form_id, record[0]),
+                search_text(map(format_value, types, record[1:])),
+                form_id,
+                record[0],
+            )
+            for record in records
+        )
+        self.db.executemany(sql, rows)
+
+    def unindex_records(self, form_id, record_ids):
+        sql = """ DELETE FROM record_search WHERE rowid = ?; """
+        self.db.executemany(sql, [(self.search_rowid(form_id, id_),) for id_ in record_ids])
+
+    def search_records(self, text, limit=100):
+        """Best matches of all forms as (form_id, form_name, record_id, snippet).
+
+        Ranking scores every match, so a query matching most of the records
+        returns the newest ones instead.
+        """
+        query = search_query(text)
+        if not query:
+            return []
+        self.create_search_index()
+        sql = """ SELECT COUNT(*) FROM (SELECT 1 FROM record_search
+                                        WHERE record_search MATCH ? LIMIT ?); """
+        matches = self.db.fetch_one(sql, (query, self.RANKED_MATCHES + 1))
+        order = "rank" if matches and matches[0] <= self.RANKED_MATCHES else "rowid DESC"
+        sql = f""" SELECT hits.form_id, forms.name, hits.record_id, hits.snippet
+                   FROM (SELECT form_id, record_id,
+                                snippet(record_search, 0, '«', '»', '…', 16) AS snippet
+                         FROM record_search WHERE record_search MATCH ?
+                         ORDER BY {order} LIMIT ?) AS hits
+                   JOIN forms ON forms.id = hits.form_id; """
+        return self.db.fetch_all(sql, (query, limit)) or []
+
+    # Rollups of the monthly report: per form and Shamsi month, the number
+    # of records (field_id 0), the sum of every amount field and the count
+    # of every multi choice value. Records are bucketed by the first date
+    # field of their form; records without a date go to year and month 0.
+    def create_rollups(self):
+        """Create the rollups table; filled from existing records once."""
+        if "report_rollups" in self.tables:
+            return
+        if not self.has_table("report_rollups"):
+            self.create_tables()
+            with self.db.transaction():
+                self.db.execute(""" CREATE TABLE report_rollups (
+                                        form_id INTEGER NOT NULL,
+                                        year INTEGER NOT NULL,
+                                        month INTEGER NOT NULL,
+                                        field_id INTEGER NOT NULL,
+                                        choice TEXT NOT NULL,
+                                        count INTEGER NOT NULL,
+                                        total INTEGER NOT NULL,
+                                        PRIMARY KEY (form_id, year, month, field_id, choice)
+                                    ) WITHOUT ROWID; """)
+                self.db.execute(ROLLUP_COUNTS_INDEX)
+                for form_id, _ in self.get_forms_with_tables():
+                    self.rebuild_rollups(form_id)
+                print("Report rollups created.")
+            if not self.has_table("report_rollups"):
+                return  # rolled back
+        self.tables["report_rollups"] = True
+
+    def rebuild_rollups(self, form_id):
+        """Roll up all records of a form again; its fields have changed."""
+        self.create_rollups()
+        self.create_table(form_id)  # a converted table rolls up itself
+        with self.db.transaction():
+            self.db.execute(""" DELETE FROM report_rollups WHERE form_id = ?; """, (form_id,))
+            after_id = 0
+            while page := self.get_records_page(form_id, after_id, 5000):
+                self.roll_up(form_id, page, 1)
+                after_id = page[-1][0]
+            return True
+
+    def roll_up(self, form_id, records, sign):
+        """Add (sign 1) or remove (sign -1) records from the rollups."""
+        fields = self.get_fields(form_id)
+        dates = [i for i, field in enumerate(fields) if field[2] == "تاریخ شمسی"]
+        amounts = [(i, field[0]) for i, field in enumerate(fields) if field[2] == "مبلغ"]
+        choices = [(i, field[0]) for i, field in enumerate(fields) if field[2] == "چند گزینه"]
+
+        deltas = {}  # (year, month, field_id, choice) -> [count, total]
+        for record in records:
+            values = record[1:]
+            date = values[dates[0]] if dates else None
+            year, month = divmod(date // 100, 100) if isinstance(date, int) else (0, 0)
+            keys = [(year, month, 0, "", 0)]
+            for i, id_ in amounts:
+                keys.append((year, month, id_, "", values[i] if isinstance(values[i], int) else 0))
+            keys += [(year, month, id_, values[i], 0) for i, id_ in choices if values[i]]
+            for *key, total in keys:
+                delta = deltas.setdefault(tuple(key), [0, 0])
+                delta[0] += sign
+                delta[1] += sign * total
+
+        sql = """ INSERT INTO report_rollups (form_id, year, month, field_id, choice, count, total)
+                  VALUES (?, ?, ?, ?, ?, ?, ?)
+                  ON CONFLICT (form_id, year, month, field_id, choice)
+                  DO UPDATE SET count = count + excluded.count, total = total + excluded.total; """
+        self.db.executemany(sql, [(form_id, *key, *delta) for key, delta in deltas.items()])
+        if sign < 0:
+            sql = """ DELETE FROM report_rollups WHERE form_id = ? AND count <= 0; """
+            self.db.execute(sql, (form_id,))
+
+    def get_report_years(self):
+        self.create_rollups()
+        sql = """ SELECT DISTINCT year FROM report_rollups
+                  WHERE field_id = 0 AND year > 0 ORDER BY year; """
+        return [row[0] for row in self.db.fetch_all(sql) or []]
+
+    def get_report(self, form_id, year=None):
+        """Rollups of a form as (bucket, field_id, choice, count, total).
+
+        Buckets are the months of `year`, or the years if it is None.
+        """
+        self.create_rollups()
+        if year is None:
+            sql = """ SELECT year, field_id, choice, SUM(count), SUM(total) FROM report_rollups
+                      WHERE form_id = ? GROUP BY year, field_id, choice; """
+            return self.db.fetch_all(sql, (form_id,)) or []
+        sql = """ SELECT month, field_id, choice, count, total FROM report_rollups
+                  WHERE form_id = ? AND year = ?; """
+        return self.db.fetch_all(sql, (form_id, year)) or []
+
+    def get_form_counts(self, year=None):
+        """Records of every form as (bucket, form_id, count); buckets as in get_report."""
+        self.create_rollups()
+        if year is None:
+            sql = """ SELECT year, form_id, SUM(count) FROM report_rollups
+                      WHERE field_id = 0 GROUP BY year, form_id; """
+            return self.db.fetch_all(sql) or []
+        sql = """ SELECT month, form_id, count FROM report_rollups
+                  WHERE field_id = 0 AND year = ?; """
+        return self.db.fetch_all(sql, (year,)) or []
+
+    def migrate_csv_files(self, data_dir):
+        """One-shot import of the old `data/<form_id>.csv` files.
+
+        Imported files are renamed to `<form_id>.csv.imported` so they are
+        never imported twice. Files of deleted forms are left alone.
+        """
+        form_ids = {form[0] for form in self.db.fetch_all(""" SELECT id FROM forms; """)}
+        for csv_file in sorted(Path(data_dir).glob("*.csv")):
+            if not csv_file.stem.isdigit() or int(csv_file.stem) not in form_ids:
+                print(f"{csv_file} has no form; skip import.")
+                continue
+
+            form_id = int(csv_file.stem)
+            start = perf_counter()
+            with open(csv_file, newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                next(reader, None)  # header; columns are matched by position
+                rows = [row for row in reader if any(value.strip() for value in row)]
+            fields = FormSchema.load(self.db, form_id).fields
+            rows = [[convert_value(*pair) for pair in zip(fields, row)] for row in rows]
+
+            if self.insert_records(form_id, rows) is None:
+                print(f"Failed to import {csv_file}.")
+                continue
+            timings().add(f"migrate {csv_file.name}", perf_counter() - start, len(rows))
+            csv_file.rename(csv_file.with_name(csv_file.name + ".imported"))
+            print(f"{csv_file} imported: {len(rows)} records.")
+
+
+class RecordJournal:
+    """Write-ahead journal of the records of rapid entry.
+
+    A record is appended to the journal file before it waits in memory
+    for its batch, so the records of a crashed session are written by
+    `replay()` at the next start. The file is flushed on every record and
+    synced to disk every SYNC_RECORDS records. Entries are numbered and
+    the last written number is saved in the transaction of the records,
+    so an entry is never written twice.
+
+    Every desktop has its own journal next to forms.db, named after the
+    client, and keeps it locked while the app runs; a second app on the
+    same desktop takes the next free slot. So only journals of sessions
+    that are gone are ever replayed.
+    """
+
+    SYNC_RECORDS = 10
+    SLOTS = 10  # apps one desktop can run at a time
+
+    def __init__(self, client=None):
+        self.db = Database.open("forms.db")
+        self.client = client or client_name()
+        self.key = None  # client and slot of the journal; set by open()
+        self.filename = None
+        self.file = None
+        self.seq = 0
+        self.unsynced = 0
+
+    def open(self):
+        """Lock the journal of the first free slot of the client."""
+        if self.file is not None:
+            return
+        db_file = Path(self.db.db_filename).resolve()
+        for slot in range(1, self.SLOTS + 1):
+            key = self.client if slot == 1 else f"{self.client}-{slot}"
+            filename = db_file.with_name(f"{db_file.stem}.{key}.journal")
+            file = open(filename, "a+", encoding="utf-8")
+            if lock_file(file):
+                self.key, self.filename, self.file = key, filename, file
+                last = max((entry[0] for entry in self.read()), default=0)
+                self.seq = max(last, self.applied())
+                return
+            file.close()  # a running app has it
+        raise OSError(f"All {self.SLOTS} journals of {self.client} are in use")
+
+    def applied(self):
+        sql = """ SELECT applied FROM journal_clients WHERE client = ?; """
+        row = self.db.fetch_one(sql, (self.key,))
+        return row[0] if row else 0
+
+    def read(self):
+        """(seq, form_id, values) entries of the file."""
+        entries = []
+        self.file.seek(0)
+        for line in self.file:
+            try:
+                entries.append(tuple(json.loads(line)))
+            except ValueError:
+                break  # partly written when the app crashed
+        return entries
+
+    def append(self, form_id, values):
+        """Journal a record; its entry number."""
+        self.open()
+        self.seq += 1
+        self.file.write(json.dumps([self.seq, form_id, values], ensure_ascii=False) + "\n")
+        self.file.flush()
+        self.unsynced += 1
+        if self.unsynced >= self.SYNC_RECORDS:
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+        return self.seq
+
+    def apply(self, entries):
+        """Write entries to the records in one transaction; number of records.
+
+        The transaction is synced to disk, so the entries can be dropped
+        from the journal after it. Records of forms deleted since are dropped.
+        """
+        self.open()
+        record_model = RecordModel()
+        forms = {}
+        for _, form_id, values in entries:
+            if FormSchema.load(self.db, form_id) is not None:
+                forms.setdefault(form_id, []).append(values)
+        with self.db.synced(), self.db.transaction():
+            for form_id, rows in forms.items():
+                record_model.insert_records(form_id, rows)
+            sql = """ INSERT INTO journal_clients (client, applied) VALUES (?, ?)
+                      ON CONFLICT (client) DO UPDATE
+                      SET applied = MAX(applied, excluded.applied); """
+            self.db.execute(sql, (self.key, max(entry[0] for entry in entries)))
+            return sum(len(rows) for rows in forms.values())
+
+    def truncate(self):
+        """Empty the file; all of its entries are written."""
+        self.open()
+        self.file.truncate(0)
+        self.unsynced = 0
+
+    def replay(self):
+        """Write the entries a crashed session left in the journal this app locked."""
+        self.open()
+        applied = self.applied()
+        entries = [entry for entry in self.read() if entry[0] > applied]
+        if entries and self.apply(entries) is None:
+            print("Failed to replay the journal; it is kept for the next start.")
+            return None
+        self.truncate()
+        if entries:
+            print(f"{len(entries)} journaled records written.")
+        return len(entries)
+
+
+def client_name():
+    """Name of this desktop in journal files: FORM_APP_CLIENT, or host and user."""
+    name = os.environ.get("FORM_APP_CLIENT")
+    if not name:
+        try:
+            user = getpass.getuser()
+        except (OSError, KeyError):
+            user = "user"
+        name = f"{socket.gethostname()}-{user}"
+    return re.sub(r"[^\w.-]", "_", name)
+
+
+def lock_file(file):
+    """Lock an open file for this process; False if another process has it."""
+    try:
+        if os.name == "nt":
+            import msvcrt
+
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+@cache
+def record_journal():
+    return RecordJournal()
+
+
 BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / "data"
 UI_DIR = BASE_DIR / "ui"
+LOG_FILE = BASE_DIR / "logs" / "form_app.log"
+LOG_LEVEL = os.environ.get("FORM_APP_LOG_LEVEL", "INFO")  # DEBUG logs every query
 print(BASE_DIR)
 
 
+def setup_logging(filename=LOG_FILE, level=LOG_LEVEL):
+    """Log to a file rotated at 1MB; the last 3 files are kept."""
+    Path(filename).parent.mkdir(exist_ok=True)
+    handler = RotatingFileHandler(filename, maxBytes=1 << 20, backupCount=3, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(threadName)s %(message)s"))
+    log.addHandler(handler)
+    log.setLevel(level)
+
+
+def migrate_database():
+    """Bring the schema of forms.db up to date; all the API server needs."""
+    Database.open("forms.db").migrate(MIGRATIONS)
+    RecordModel().prune_changes()
+    RecordModel().create_derived_tables()
+
+
+def prepare_database(data_dir=DATA_DIR):
+    """Bring forms.db up to date and write what the last session left behind."""
+    migrate_database()
+    # Records used to live in data/<form_id>.csv files
+    RecordModel().migrate_csv_files(data_dir)
+    # records of rapid entry a crash kept from being written
+    record_journal().replay()
+
+
+@cache
+def read_ui(filename):
+    """Content of a .ui file; each file is read from disk once."""
+    return QByteArray((UI_DIR / filename).read_bytes())
+
+
+@cache
+def ui_loader():
+    return QUiLoader()
+
 
 def load_ui(filename):
-    ui_file = QFile(UI_DIR / filename)
-    ui_file.open(QFile.ReadOnly)
-    loader = QUiLoader()
-    window = loader.load(ui_file)
+    ui_file = QBuffer()
+    ui_file.setData(read_ui(filename))
+    ui_file.open(QIODevice.ReadOnly)
+    window = ui_loader().load(ui_file)
     return window
 
+
+@cache
+def shamsi_models():
+    """Year, month and day items shared by the date combos of all forms."""
+    return tuple(QStringListModel(items) for items in (SHAMSI_YEARS, SHAMSI_MONTHS, SHAMSI_DAYS))
+
+
+def reload_items(combo, items):
+    """Replace items of a combo box without emitting its change signals.
+
+    The current item stays selected if it is still in items.
+    """
+    current = combo.currentText()
+    combo.blockSignals(True)
+    combo.clear()
+    combo.addItems(items)
+    combo.setCurrentIndex(combo.findText(current) if current else -1)
+    combo.blockSignals(False)
+    return bool(current) and current in items
+
+
+class TaskSignals(QObject):
+    progress = Signal(int)
+    finished = Signal(object)
+    failed = Signal(str)
+
+
+class TaskMonitor(QObject):
+    """Tasks running on the thread pool; drives the busy indicator."""
+
+    changed = Signal(int)  # number of running tasks
+
+    def __init__(self):
+        super().__init__()
+        self.tasks = set()
+
+    def add(self, task):
+        self.tasks.add(task)
+        self.changed.emit(len(self.tasks))
+
+    def remove(self, task):
+        self.tasks.discard(task)
+        self.changed.emit(len(self.tasks))
+
+    def cancel_all(self):
+        for task in list(self.tasks):
+            task.cancel()
+
+
+@cache
+def task_monitor():
+    return TaskMonitor()
+
+
+class Task(QRunnable):
+    """Run a function on the global QThreadPool.
+
+    The return value is sent by `signals.finished`; slots run on the GUI
+    thread. A generator function also reports every value it yields by
+    `signals.progress` and `cancel()` stops it at its next yield.
+    """
+
+    def __init__(self, function, *args):
+        super().__init__()
+        self.setAutoDelete(False)  # the Python side owns the task
+        self.function = function
+        self.args = args
+        self.signals = TaskSignals()
+        self.cancelled = False
+
+    def start(self):
+        monitor = task_monitor()
+        monitor.add(self)
+        self.signals.finished.connect(lambda _: monitor.remove(self))
+        self.signals.failed.connect(lambda _: monitor.remove(self))
+        QThreadPool.globalInstance().start(self)
+        return self
+
+    def cancel(self):
+        self.cancelled = True
+
+    @property
+    def name(self):
+        return f"task {getattr(self.function, '__qualname__', self.function)}"
+
+    def run(self):
+        steps = None
+        start = perf_counter()
+        try:
+            result = self.function(*self.args)
+            if isinstance(result, GeneratorType):
+                steps, result = result, None
+                while not self.cancelled:
+                    try:
+                        value = next(steps)
+                    except StopIteration as stop:
+                        result = stop.value
+                        break
+                    self.signals.progress.emit(value)
+                steps.close()  # cancel: run the generator's cleanup before finishing
+            self.signals.finished.emit(result)
+        except Exception as e:
+            print(f"Task failed: {e}")
+            log.exception("Task %s failed", self.name)
+            self.signals.failed.emit(str(e))
+        finally:
+            if steps is not None:
+                steps.close()
+            timings().add(self.name, perf_counter() - start)
+
+
 # ==================
 # -- Table --
 # ==================
@@ -419,6 +1965,12 @@ class TableUpdateForm:
         self.form_frame = None
         self.widget_index = 0
 
+    def refresh(self):
+        """Reload form names when the screen is shown again."""
+        if not reload_items(self.ui.form_names, self.model.get_form_names()):
+            self.clear_body()
+            self.ui.update_button.setEnabled(False)
+
     def clear_body(self):
         # if self.form_frame is not None:
         #     self.form_frame.deleteLater()
@@ -473,10 +2025,23 @@ class TableUpdateForm:
             self.widget_index += 1
 
     def on_form_name_select(self, index):
+        if index < 0:  # combo box cleared
+            return
+        self.ui.update_button.setEnabled(False)
+        task = Task(self.load_form, index)
+        task.signals.finished.connect(lambda form: self.on_form_load(index, form))
+        self.task = task.start()
+
+    def load_form(self, index):
+        """Form id, name and fields of the form at index; runs on a worker thread."""
         forms = self.model.get_forms()
-        # maybe some check required
-        self.selected_form_id, self.selected_form_name = forms[index]
-        self.selected_form_fields = self.model.get_form_fields_with_id(self.selected_form_id)
+        form_id, form_name = forms[index]
+        return form_id, form_name, self.model.get_form_fields_with_id(form_id)
+
+    def on_form_load(self, index, form):
+        if index != self.ui.form_names.currentIndex():
+            return  # another form selected meanwhile
+        self.selected_form_id, self.selected_form_name, self.selected_form_fields = form
         self.make_update_form()
         self.ui.update_button.setEnabled(True)
 
@@ -484,13 +2049,8 @@ class TableUpdateForm:
         ### Update Form Name
         form_name_widget = self.ui.form_frame.findChild(QLineEdit, "form_name")
         form_name = form_name_widget.text()
-        self.model.update_form_name(self.selected_form_id, form_name)
-        form_names = self.model.get_form_names()
-        self.ui.form_names.clear()
-        self.ui.form_names.addItems(form_names)
-        self.ui.form_names.setCurrentText(form_name)
 
-        ### Update Fields
+        ### Fields
         row_frames = self.ui.body.findChildren(QFrame, options=Qt.FindDirectChildrenOnly)
         fields = []
         for row_frame in row_frames:
@@ -499,7 +2059,17 @@ class TableUpdateForm:
             field_id = row_frame.findChild(QLabel).text()
             fields.append((field_name, field_type, field_id))
 
-        self.model.update_form_fields(fields)
+        self.ui.update_button.setEnabled(False)
+        task = Task(self.model.update_form, self.selected_form_id, form_name, fields)
+        task.signals.finished.connect(lambda _: self.on_form_update(form_name))
+        self.task = task.start()
+
+    def on_form_update(self, form_name):
+        form_names = self.model.get_form_names()
+        self.ui.form_names.clear()
+        self.ui.form_names.addItems(form_names)
+        self.ui.form_names.setCurrentText(form_name)
+        self.ui.update_button.setEnabled(True)
 
 
 class TableDeleteForm:
@@ -517,6 +2087,12 @@ class TableDeleteForm:
 
         self.ui.delete_button.clicked.connect(self.on_delete)
 
+    def refresh(self):
+        """Reload forms when the screen is shown again."""
+        self.form_data = self.model.get_forms()
+        self.ui.table.setRowCount(len(self.form_data))
+        self.populate_table()
+
     def populate_table(self):
         self.ui.table.setCurrentCell(0, 0)
 
@@ -537,32 +2113,350 @@ class TableDeleteForm:
         ]
         return selected_row
 
-    def delete_selected_row(self):
-        selected_row_index = self.ui.table.currentRow()
-        self.ui.table.removeRow(selected_row_index)
+    def delete_row(self, form_id):
+        for row_index in range(self.ui.table.rowCount()):
+            if self.ui.table.item(row_index, 0).text() == form_id:
+                self.ui.table.removeRow(row_index)
+                return
+
+    def delete_form(self, form_id):
+        """Runs on the thread pool; True, or the error the delete was rolled back on."""
+        return self.model.delete_form(form_id) or str(self.model.db.last_error)
 
     def on_delete(self):
         form_id, form_name = self.get_selected_row()
-        # delete from table
-        self.delete_selected_row()
-        # delete operation on db
-        self.model.delete_form(form_id)
+        self.ui.delete_button.setEnabled(False)
+        task = Task(self.delete_form, form_id)
+        task.signals.finished.connect(partial(self.on_deleted, form_id, form_name))
+        task.signals.failed.connect(partial(self.on_deleted, form_id, form_name))
+        self.task = task.start()
+
+    def on_deleted(self, form_id, form_name, result):
+        self.ui.delete_button.setEnabled(True)
+        if result is not True:  # rolled back, or the error of the failed task
+            QMessageBox.warning(self.ui, "خطا", f"فرم {form_name} حذف نشد.\n{result}")
+            return
+        self.delete_row(form_id)
+        # reclaim the space of the records in the background
+        self.task = Task(RecordModel().compact).start()
 
 
 # ==================
 # -- Data --
 # ==================
+# Rules of the insert form widgets; the importer validates with them too.
+# Validators turn the text of a field into the value stored for it.
+NUMBER_PATTERN = "[۰-۹]*"
+PERSIAN_DIGITS = str.maketrans("0123456789٠١٢٣٤٥٦٧٨٩", "۰۱۲۳۴۵۶۷۸۹" * 2)
+LATIN_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "0123456789" * 2)
+SHAMSI_YEARS = [str(i) for i in range(1390, 1410)]
+SHAMSI_MONTHS = [
+    "فروردین",
+    "اردیبهشت",
+    "خرداد",
+    "تیر",
+    "مرداد",
+    "شهریور",
+    "مهر",
+    "آبان",
+    "آذر",
+    "دی",
+    "بهمن",
+    "اسفند",
+]
+SHAMSI_DAYS = [str(i) for i in range(1, 32)]
+# Column types of the records tables; the rest are TEXT. Dates are stored
+# as 14021113 numbers and the digits of card, account and shaba numbers
+# without separators.
+COLUMN_TYPES = {
+    "عدد": "INTEGER",
+    "مبلغ": "INTEGER",
+    "تاریخ شمسی": "DATE",
+    "شماره حساب": "CHAR",
+    "شماره کارت": "CHAR",
+    "شماره شبا": "CHAR",
+    "شماره تماس": "CHAR",
+    "کد ملی": "CHAR",
+}
+RANGE_TYPES = ("عدد", "مبلغ", "تاریخ شمسی")
+
+
+# Text of records as indexed for search: latin digits and Persian letters
+# so the same number or name matches however it was typed.
+SEARCH_CHARS = list(zip("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩يكى", "0123456789" * 2 + "یکی"))
+
+
+def search_normalize(text):
+    # str.translate is several times slower on Persian text
+    for char, replacement in SEARCH_CHARS:
+        if char in text:
+            text = text.replace(char, replacement)
+    return text
+
+
+def search_digits(value):
+    """1234-5678, 120,000 and IR-1234 as bare digits; None for other values."""
+    if "-" not in value and "," not in value:
+        return None
+    digits = value.replace("-", "").replace(",", "").removeprefix("IR")
+    return digits if digits.isdigit() else None
+
+
+def search_text(values):
+    """Values of a record as one text; separated numbers are also added
+    as bare digits so they match with or without separators."""
+    words = []
+    for value in values:
+        value = str(value or "")
+        words.append(value)
+        if digits := search_digits(value):
+            words.append(digits)
+    return search_normalize(" ".join(words))
+
+
+def search_query(text):
+    """fts5 query matching records that have all the words as prefixes."""
+    words = [search_digits(word) or word for word in search_normalize(text).split()]
+    return " ".join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+FILTER_OPERATORS = {"شامل": "contains", "برابر": "equals", "بازه": "between"}
+
+
+class ValidationError(Exception):
+    pass
+
+
+def validate_text(field, value):
+    if not value.strip():
+        raise ValidationError(f"{field.name}: خالی است")
+    return value
+
+
+def validate_detail(field, value):
+    return value
+
+
+def validate_digits(field, value, max_length=None):
+    """Digits as a string of latin digits; keeps leading zeros."""
+    value = value.strip().translate(PERSIAN_DIGITS)
+    if not value or not re.fullmatch(NUMBER_PATTERN, value):
+        raise ValidationError(f"{field.name}: عدد نیست")
+    if max_length and len(value) > max_length:
+        raise ValidationError(f"{field.name}: بیشتر از {max_length} رقم")
+    return value.translate(LATIN_DIGITS)
+
+
+def validate_number(field, value):
+    return int(validate_digits(field, value, max_length=18))
+
+
+def validate_amount(field, value):
+    return validate_number(field, value.replace(",", ""))
+
+
+def validate_groups(field, value, count, size=4):
+    """Digit groups of account and card numbers: 1234-1234-1234-1234
+
+    Full groups are stored as their digits; groups with fewer digits keep
+    the dashes, or the digits would move to other groups when shown.
+    """
+    value = value.strip()
+    if "-" in value:
+        groups = value.split("-")
+    else:
+        groups = [value[i : i + size] for i in range(0, len(value), size)]
+    if len(groups) != count or any(len(group) > size for group in groups):
+        raise ValidationError(f"{field.name}: باید {count} بخش {size} رقمی باشد")
+    groups = [validate_digits(field, group) for group in groups]
+    if all(len(group) == size for group in groups):
+        return "".join(groups)
+    return "-".join(groups)
+
+
+def validate_account_number(field, value):
+    return validate_groups(field, value, 4)
+
+
+def validate_card_number(field, value):
+    return validate_groups(field, value, 4)
+
+
+def validate_shaba_number(field, value):
+    """IR-1234-1234-1234-1234-1234-1234-1234; stored without IR."""
+    value = value.strip().upper()
+    if not value.startswith("IR"):
+        raise ValidationError(f"{field.name}: باید با IR شروع شود")
+    groups = value[2:].strip("-")
+    # 24 digit shaba fills 6 groups; the insert form has room for 7
+    count = groups.count("-") + 1 if "-" in groups else -(-len(groups) // 4)
+    return validate_groups(field, groups, count if count in (6, 7) else 7)
+
+
+def validate_shamsi_date(field, value):
+    """Year-Month-Day like 1404-اردیبهشت-14; month may be a number.
+    Stored as the number 14040214 so dates compare and sort."""
+    parts = value.strip().translate(LATIN_DIGITS).replace("/", "-").split("-")
+    if len(parts) != 3:
+        raise ValidationError(f"{field.name}: تاریخ نامعتبر")
+    year, month, day = (part.strip() for part in parts)
+    if month.isdigit() and 1 <= int(month) <= len(SHAMSI_MONTHS):
+        month = SHAMSI_MONTHS[int(month) - 1]
+    day = day.lstrip("0")
+    if year not in SHAMSI_YEARS or month not in SHAMSI_MONTHS or day not in SHAMSI_DAYS:
+        raise ValidationError(f"{field.name}: تاریخ نامعتبر")
+    return int(year) * 10000 + (SHAMSI_MONTHS.index(month) + 1) * 100 + int(day)
+
+
+def shamsi_date_pattern(text):
+    """LIKE pattern of stored dates for a part of a date: 1404-اردیبهشت,
+    اردیبهشت-14 or 1404/2; None for plain digits or text that is no date."""
+    parts = [part.strip() for part in text.translate(LATIN_DIGITS).replace("/", "-").split("-")]
+    parts = [part for part in parts if part]
+    if not parts or (len(parts) == 1 and parts[0].isdigit()):
+        return None
+    start = 1 if parts[0] in SHAMSI_MONTHS else 0  # year, month, day slots
+    if start + len(parts) > 3:
+        return None
+    widths = (4, 2, 2)
+    pattern = ["_" * width for width in widths]
+    for slot, part in enumerate(parts, start=start):
+        if slot == 1 and part in SHAMSI_MONTHS:
+            part = str(SHAMSI_MONTHS.index(part) + 1)
+        if not part.isdigit() or len(part) > widths[slot]:
+            return None
+        pattern[slot] = part.zfill(widths[slot])
+    return "".join(pattern)
+
+
+def validate_phone(field, value):
+    return validate_digits(field, value, max_length=11)
+
+
+def validate_code_meli(field, value):
+    return validate_digits(field, value, max_length=10)
+
+
+def validate_multichoice(field, value):
+    value = value.strip()
+    if value not in field.options:
+        raise ValidationError(f"{field.name}: گزینه نامعتبر")
+    return value
+
+
+FIELD_VALIDATORS = {
+    "متن": validate_text,
+    "عدد": validate_number,
+    "مبلغ": validate_amount,
+    "شماره حساب": validate_account_number,
+    "شماره کارت": validate_card_number,
+    "شماره شبا": validate_shaba_number,
+    "توضیحات": validate_detail,
+    "تاریخ شمسی": validate_shamsi_date,
+    "شماره تماس": validate_phone,
+    "کد ملی": validate_code_meli,
+    "چند گزینه": validate_multichoice,
+}
+
+
+def parse_value(field, value):
+    """Stored value of a field from its text; None if it is not valid."""
+    try:
+        return FIELD_VALIDATORS.get(field.type, validate_detail)(field, value)
+    except ValidationError:
+        return None
+
+
+def convert_value(field, value, column_type="TEXT"):
+    """A value read from a column of another type as a value of the field;
+    kept as text if it does not fit the field."""
+    if value is None or value == "":
+        return None if field.type in COLUMN_TYPES else value
+    if column_type == "DATE" and isinstance(value, int):
+        text = format_shamsi_date(value)
+    else:
+        text = str(value)
+    parsed = parse_value(field, text)
+    return text if parsed is None else parsed
+
+
+# Display text of stored values
+def format_digits(value):
+    return str(value).translate(PERSIAN_DIGITS)
+
+
+def format_amount(value):
+    return f"{value:,}".translate(PERSIAN_DIGITS)
+
+
+def format_groups(value, size=4):
+    if "-" in value:  # not full groups; stored as they were typed
+        return "-".join(format_digits(group) for group in value.split("-"))
+    return "-".join(format_digits(value[i : i + size]) for i in range(0, len(value), size))
+
+
+def format_shaba_number(value):
+    return "IR-" + format_groups(value)
+
+
+def format_shamsi_date(value):
+    year, month_day = divmod(value, 10000)
+    month, day = divmod(month_day, 100)
+    return f"{year}-{SHAMSI_MONTHS[month - 1]}-{day}"
+
+
+FIELD_FORMATS = {
+    "عدد": format_digits,
+    "مبلغ": format_amount,
+    "شماره حساب": format_groups,
+    "شماره کارت": format_groups,
+    "شماره شبا": format_shaba_number,
+    "تاریخ شمسی": format_shamsi_date,
+    "شماره تماس": format_digits,
+    "کد ملی": format_digits,
+}
+
+
+def format_value(field_type, value):
+    """Display text of a stored value; a value that does not fit the type
+    is shown as it is."""
+    if value is None:
+        return ""
+    formatter = FIELD_FORMATS.get(field_type)
+    try:
+        return formatter(value) if formatter else str(value)
+    except (TypeError, ValueError, IndexError):
+        return str(value)
+
+
 class DataInsertForm:
-    DATA_DIR = BASE_DIR / "data"
+    # rows past this many are built on the event loop, a chunk at a time
+    EAGER_ROWS = 30
+    LAZY_CHUNK = 20
+    # rapid entry saves its records every this many records or milliseconds
+    FLUSH_RECORDS = 50
+    FLUSH_MS = 2000
 
     def __init__(self):
         self.ui = load_ui("insert.ui")
         self.model = DataModel()
+        self.record_model = RecordModel()
         self.index = 0
         self.header = []
         self.rows = []
         self.data = []
-        self.mc_index = 0
+        self.fields = []
+        self.built = []  # (key, frame, label, widgets, defaults) of the shown rows
+        self.pending = []  # fields of the form not built yet
+        self.pool = {}  # key -> hidden rows of earlier forms to reuse
+        self.validator = QRegularExpressionValidator(QRegularExpression(NUMBER_PATTERN), self.ui)
+        self.buffer = []  # journal entries of rapid entry not written yet
+        self.flushing = 0  # flushes running on the thread pool
+        self.flush_done = QEventLoop()  # flush(wait=True) runs it until a running flush is done
+        self.flush_timer = QTimer(self.ui)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(self.FLUSH_MS)
+        self.flush_timer.timeout.connect(self.flush)
 
         # get form names and set it to combobox
         names = self.model.get_form_names()
@@ -573,30 +2467,51 @@ class DataInsertForm:
         # on save
         self.ui.save_button.clicked.connect(self.on_save)
 
+    def refresh(self):
+        """Reload form names when the screen is shown again."""
+        if not reload_items(self.ui.form_names, self.model.get_form_names()):
+            self.clear_form()
+
     def clear_form_content(self):
-        for widgets in self.rows:
-            for widget in widgets:
-                if isinstance(widget, QLineEdit):
-                    widget.clear()
-                elif isinstance(widget, QLineEdit):
-                    widget.clear()
-                else:
-                    print(f"Uknow widget to clear content of it {widget}")
+        self.finish_build()
+        for _, _, _, widgets, defaults in self.built:
+            self.reset_widgets(widgets, defaults)
+
+    def widget_state(self, widget):
+        if isinstance(widget, QLineEdit):
+            return widget.text()
+        elif isinstance(widget, QComboBox):
+            return widget.currentIndex()
+        elif isinstance(widget, QTextEdit):
+            return widget.toPlainText()
+        print(f"Uknow widget to clear content of it {widget}")
+
+    def reset_widgets(self, widgets, defaults):
+        """Put the widgets of a row back to how they were built."""
+        for widget, default in zip(widgets, defaults):
+            widget.setStyleSheet("")
+            if isinstance(widget, QLineEdit):
+                widget.setText(default)
+            elif isinstance(widget, QComboBox):
+                widget.setCurrentIndex(default)
+            elif isinstance(widget, QTextEdit):
+                widget.setPlainText(default)
 
     def row_frames(self):
         """Get all field frame in fields_frame"""
-        return self.ui.body.findChildren(QFrame, options=Qt.FindDirectChildrenOnly)
+        return [frame for _, frame, _, _, _ in self.built]
 
     def is_empty(self):
         """Check all field name widgets to not be empty."""
+        self.finish_build()
 
         flag = False
-        for frame in self.row_frames():
-            for child in frame.findChildren(QWidget):
+        for widgets in self.rows:
+            for child in widgets:
                 child.setStyleSheet("")
 
-        for frame in self.row_frames():
-            for child in frame.findChildren(QWidget):
+        for widgets in self.rows:
+            for child in widgets:
                 if isinstance(child, QLineEdit):
                     if not child.text().strip():
                         child.setStyleSheet("border: 2px solid red;")
@@ -611,6 +2526,7 @@ class DataInsertForm:
         each field store as element of list
         ex: ["John", "1234-4445-3333-1231", "1234555555"]
         """
+        self.finish_build()
         data = []
 
         for widgets in self.rows:
@@ -630,47 +2546,143 @@ class DataInsertForm:
         data = ["-".join(row) for row in data]
         return data
 
+    def get_values(self):
+        """Values of the form as stored; ValidationError if one is invalid."""
+        return [
+            FIELD_VALIDATORS.get(field.type, validate_detail)(field, text)
+            for field, text in zip(self.fields, self.get_row())
+        ]
+
+    def set_values(self, values):
+        """Fill the widgets with stored values of a record."""
+        self.finish_build()
+        for field, widgets, value in zip(self.fields, self.rows, values):
+            text = format_value(field.type, value)
+            # widgets of a composite field get its parts: 1234-5678, year-month-day
+            parts = text.split("-") if len(widgets) > 1 else [text]
+            for widget, part in zip(widgets, parts):
+                if isinstance(widget, QLineEdit):
+                    widget.setText(part)
+                elif isinstance(widget, QComboBox):
+                    widget.setCurrentText(part)
+                elif isinstance(widget, QTextEdit):
+                    widget.setPlainText(part)
+
     def on_save(self):
-        header = self.get_header()
-        row = self.get_row()
         if self.is_empty():
             return
+        try:
+            row = self.get_values()
+        except ValidationError as e:
+            print(e)
+            return
 
         selected_form_name = self.ui.form_names.currentText()
         fid = self.model.get_form_id(selected_form_name)
-        csv_file = f"{fid}.csv"
+        if self.ui.rapid_entry.isChecked():
+            # the record is written later with others; the form is ready right away
+            self.buffer.append((record_journal().append(fid, row), fid, row))
+            self.clear_form_content()
+            self.focus_first()
+            if len(self.buffer) >= self.FLUSH_RECORDS:
+                self.flush()
+            elif not self.flush_timer.isActive():
+                self.flush_timer.start()
+            self.show_buffered()
+            return
 
-        if self.is_csv_exist(csv_file):
-            self.append_csv(csv_file, row)
-        else:
-            self.create_csv(csv_file, header)
-            self.append_csv(csv_file, row)
+        self.ui.save_button.setEnabled(False)
+        task = Task(self.record_model.insert_record, fid, row)
+        task.signals.finished.connect(lambda record_id: self.on_saved(fid, record_id))
+        self.task = task.start()
+
+    def on_saved(self, fid, record_id):
+        self.ui.save_button.setEnabled(True)
+        if record_id is None:
+            print(f"Failed to save record of form {fid}.")
+            return
 
         # After save: delete inserted data to able to add new data.
         self.clear_form_content()
-        print(f"{csv_file} Saved succesfully.")
+        print(f"Record {record_id} of form {fid} saved succesfully.")
 
-    def is_csv_exist(self, filename):
-        print(filename in os.listdir(self.DATA_DIR))
-        return filename in os.listdir(self.DATA_DIR)
+    def on_return(self):
+        if self.ui.rapid_entry.isChecked():
+            self.on_save()
 
-    def create_csv(self, filename, header):
-        pd.DataFrame(columns=header).to_csv(self.DATA_DIR / filename, index=False)
+    def focus_first(self):
+        for widget in self.rows[0] if self.rows else []:
+            if widget.isEnabled():
+                widget.setFocus()
+                return
 
-    def append_csv(self, filename, row):
-        df = pd.DataFrame([row])
-        df.to_csv(self.DATA_DIR / filename, mode="a", index=False, header=False)
-        print(f"{self.DATA_DIR}/{filename} saved.")
+    def flush(self, wait=False):
+        """Write the records of rapid entry in one transaction.
+
+        wait writes them on this thread, as when the app closes.
+        """
+        self.flush_timer.stop()
+        if wait:
+            while self.flushing:  # its records are older; let them finish first
+                self.flush_done.exec()
+        elif self.flushing:
+            self.flush_timer.start()  # one flush at a time keeps entries in order
+            return
+        entries, self.buffer = self.buffer, []
+        if entries:
+            self.flushing += 1
+            if wait:
+                self.on_flushed(entries, record_journal().apply(entries))
+            else:
+                task = Task(record_journal().apply, entries)
+                task.signals.finished.connect(partial(self.on_flushed, entries))
+                task.signals.failed.connect(partial(self.on_flushed, entries))
+                self.flush_task = task.start()
+        self.show_buffered()
+
+    def on_flushed(self, entries, result):
+        self.flushing -= 1
+        if not isinstance(result, int):  # rolled back or failed
+            # keep them for the next flush; the journal has them anyway
+            print(f"Failed to save {len(entries)} records; will retry.")
+            # unless their form is deleted; they would fail forever
+            self.buffer[:0] = [entry for entry in entries if self.model.get_schema(entry[1])]
+            if self.buffer:
+                self.flush_timer.start()
+        else:
+            print(f"{result} records saved succesfully.")
+            if not self.buffer:
+                record_journal().truncate()
+            elif len(self.buffer) >= self.FLUSH_RECORDS:
+                self.flush()
+        self.show_buffered()
+        self.flush_done.quit()
+
+    def show_buffered(self):
+        text = f"در صف: {len(self.buffer)}" if self.buffer else ""
+        self.ui.buffered_label.setText(text.translate(PERSIAN_DIGITS))
 
     def on_form_name_select(self):
         # delete form_frame if there is a form
         self.clear_form()
         selected_form_name = self.ui.form_names.currentText()
-        form_id = self.model.get_form_id(selected_form_name)
-        fields = self.model.get_form_fields(form_id)
-        self.build_form(fields, self.ui.body)
+        schema = self.model.get_schema_by_name(selected_form_name)
+        if schema is not None:
+            self.build_form(schema.fields, self.ui.body)
 
     def clear_form(self):
+        """Hide the rows of the form and keep them for the next forms."""
+        self.pending = []
+        for row in self.built:
+            key, frame, _, widgets, defaults = row
+            frame.hide()
+            frame.parentWidget().layout().removeWidget(frame)
+            self.reset_widgets(widgets, defaults)
+            self.pool.setdefault(key, []).append(row)
+        self.built = []
+        self.header = []
+        self.rows = []
+        self.fields = []
         while self.ui.form_layout.count():
             child = self.ui.form_layout.takeAt(0)
             if child.widget():
@@ -688,7 +2700,46 @@ class DataInsertForm:
         # base is the place frame will shown
         self.header = []
         self.rows = []
-        self.widgets = []  # list widgets that created in the form
+        self.fields = []
+        self.built = []
+        self.base = base
+        self.pending = [Field(*field) for field in fields]  # (name, type) pairs are fields too
+        self.build_rows(self.EAGER_ROWS)
+        if self.pending:
+            QTimer.singleShot(0, self.build_pending)
+
+    def build_pending(self):
+        if self.pending:
+            self.build_rows(self.LAZY_CHUNK)
+        if self.pending:
+            QTimer.singleShot(0, self.build_pending)
+
+    def finish_build(self):
+        """Build the rest of the rows now; values are read or written."""
+        self.build_rows(len(self.pending))
+
+    def build_rows(self, count):
+        fields, self.pending = self.pending[:count], self.pending[count:]
+        for field in fields:
+            # a row of a field with the same type and options is reused
+            key = (field.type, tuple(field.options))
+            if self.pool.get(key):
+                row = self.pool[key].pop()
+                row[2].setText(field.name)
+            else:
+                row = self.build_row(key, field)
+            self.fields.append(field)
+            self.header.append(row[2])
+            self.rows.append(row[3])
+            self.built.append(row)
+            # before anything added to the base after the form, like a button
+            self.base.layout().insertWidget(len(self.built) - 1, row[1])
+            row[1].show()
+
+    def build_row(self, key, field):
+        """Widgets of a field; (key, frame, label, widgets, defaults)."""
+        header, rows = self.header, self.rows
+        self.header, self.rows = [], []
         # Types
         field_type_handlers = {
             "متن": self.input_type,  # Done
@@ -704,20 +2755,26 @@ class DataInsertForm:
             "چند گزینه": self.multichoice_type,
         }
 
-        for field_index, field in enumerate(fields):
-            name = field[0]
-            ftype = field[1]
-            self.field_name_label = name
-            frame, layout = self.continer()
-            self.name_type(name, layout)
+        name = field.name
+        ftype = field.type
+        self.field = field
+        self.field_name_label = name
+        frame, layout = self.continer()
+        self.name_type(name, layout)
 
-            if handler := field_type_handlers.get(ftype):
-                handler(layout)
-            else:
-                print(f"Field type not recognized: '{ftype}'. No widget created.")
+        if handler := field_type_handlers.get(ftype):
+            handler(layout)
+        else:
+            print(f"Field type not recognized: '{ftype}'. No widget created.")
+            self.rows.append([])
 
-            base.layout().addWidget(frame)
-            self.index += 1
+        self.index += 1
+        (label,), (widgets,) = self.header, self.rows
+        for widget in widgets:
+            if isinstance(widget, QLineEdit):
+                widget.returnPressed.connect(self.on_return)
+        self.header, self.rows = header, rows
+        return key, frame, label, widgets, [self.widget_state(w) for w in widgets]
 
     def name_type(self, name, layout):
         label = QLabel(name)
@@ -755,7 +2812,6 @@ class DataInsertForm:
         self.rows.append([e])
 
     def account_nubmer_type(self, layout):
-        # jump to next lineedit after fill 4 numbers
         # TODO: remeber order of line edits when grabing data
         """1234-1234-1234-1234"""
         edits = []
@@ -771,6 +2827,7 @@ class DataInsertForm:
             self.index += 1
             layout.addWidget(e)
             layout.setStretchFactor(e, 3)
+        self.auto_advance(edits[::-1])
         self.rows.append(edits[::-1])
 
     def card_number_type(self, layout):
@@ -788,6 +2845,7 @@ class DataInsertForm:
             self.index += 1
             layout.addWidget(e)
             layout.setStretchFactor(e, 3)
+        self.auto_advance(edits[::-1])
         self.rows.append(edits[::-1])
 
     def shaba_number_type(self, layout):
@@ -827,6 +2885,7 @@ class DataInsertForm:
         layout.setStretchFactor(e6, 6)
         layout.setStretchFactor(e7, 6)
         layout.setStretchFactor(e8, 1)
+        self.auto_advance(edits[::-1][1:])  # after the IR edit
         # we must do this.
         self.rows.append(edits[::-1])
 
@@ -838,24 +2897,11 @@ class DataInsertForm:
         y.setObjectName(f"shamsi_year_{self.index}")
         m.setObjectName(f"shamsi_month{self.index}")
         d.setObjectName(f"shamsi_day{self.index}")
-        months_shamsi = [
-            "فروردین",
-            "اردیبهشت",
-            "خرداد",
-            "تیر",
-            "مرداد",
-            "شهریور",
-            "مهر",
-            "آبان",
-            "آذر",
-            "دی",
-            "بهمن",
-            "اسفند",
-        ]
-        y.addItems([str(i) for i in range(1390, 1410)])
+        years, months, days = shamsi_models()
+        y.setModel(years)
         y.setCurrentText(str(1404))
-        m.addItems(months_shamsi)
-        d.addItems([str(i) for i in range(1, 32)])
+        m.setModel(months)
+        d.setModel(days)
 
         layout.addWidget(d)
         layout.addWidget(m)
@@ -874,19 +2920,9 @@ class DataInsertForm:
         combo.setObjectName(f"multi_choice_{self.index}")
         layout.addWidget(combo)
 
-        # db quries
-        # remeber you cannot use option_ids.pop(0) cuz option_ids populated
-        #   every time a multi choice field created.
-        selected_form_name = self.ui.form_names.currentText()
-        form_id = self.model.get_form_id(selected_form_name)
-        option_ids = self.model.get_field_option_id(form_id)
-        option_ids = [oid[0] for oid in option_ids]
-        options = self.model.get_options(option_ids[self.mc_index])
-        print(options)
-        #
-        combo.addItems([item[0] for item in options])
+        # options come with the form schema
+        combo.addItems(self.field.options)
         self.rows.append([combo])
-        self.mc_index += 1
 
     def phone_type(self, layout):
         e = QLineEdit()
@@ -904,9 +2940,18 @@ class DataInsertForm:
         layout.addWidget(e)
         self.rows.append([e])
 
+    def auto_advance(self, edits):
+        """Jump to the next edit of a field when one is full."""
+        for edit, next_edit in zip(edits, edits[1:]):
+            edit.textEdited.connect(partial(self.on_group_edit, edit, next_edit))
+
+    def on_group_edit(self, edit, next_edit, text):
+        if len(text) >= edit.maxLength():
+            next_edit.setFocus()
+            next_edit.selectAll()
+
     def number_validator(self):
-        validator = QRegularExpressionValidator(QRegularExpression("[۰-۹]*"))
-        return validator
+        return self.validator  # one validator serves all the number edits
 
     def format_amount(self, line_edit):
         text = line_edit.text()
@@ -917,183 +2962,805 @@ class DataInsertForm:
         line_edit.setCursorPosition(cursor_pos + formatted.count(","))
 
 
+class RecordImporter:
+    """Stream a CSV file into the records of a form.
+
+    Each row is validated with the rules of the insert form widgets and
+    valid rows are saved in batches, one transaction per batch. Rejected
+    rows go to `<file>.rejected.csv` with the reason in the last column.
+    """
+
+    BATCH_SIZE = 1000
+
+    def __init__(self, record_model, schema, filename):
+        self.record_model = record_model
+        self.schema = schema
+        self.filename = Path(filename)
+        self.rejected_filename = self.filename.with_suffix(".rejected.csv")
+        self.imported = 0
+        self.rejected = 0
+        self.failed = 0  # valid rows of batches the database refused; rejected too
+        self.header = []
+        self.rejected_file = None
+
+    def count_rows(self):
+        """Number of lines of the file, read in chunks, for the progress."""
+        lines = 0
+        with open(self.filename, "rb") as f:
+            while chunk := f.read(1 << 20):
+                lines += chunk.count(b"\n")
+        return max(lines - 1, 0)  # header
+
+    def column_positions(self, header):
+        """Match columns by field name; fall back to column order."""
+        names = [field.name for field in self.schema.fields]
+        if all(name in header for name in names):
+            return [header.index(name) for name in names]
+        return list(range(len(names)))
+
+    def validate(self, row, positions):
+        values = []
+        for field, position in zip(self.schema.fields, positions):
+            value = row[position] if position < len(row) else ""
+            validator = FIELD_VALIDATORS.get(field.type, validate_detail)
+            values.append(validator(field, value))
+        return values
+
+    def run(self):
+        """Import the file; yield the number of read rows after each batch.
+
+        Stop iterating to cancel; batches saved so far are kept.
+        """
+        try:
+            with open(self.filename, newline="", encoding="utf-8-sig") as f:
+                reader = csv.reader(f)
+                self.header = next(reader, [])
+                positions = self.column_positions(self.header)
+                rows, batch = [], []  # rows as read and their validated values
+                for line, row in enumerate(reader, start=1):
+                    try:
+                        batch.append(self.validate(row, positions))
+                        rows.append(row)
+                    except ValidationError as e:
+                        self.reject(row, e)
+
+                    if line % self.BATCH_SIZE == 0:
+                        self.save(rows, batch)
+                        rows, batch = [], []
+                        yield line
+
+                self.save(rows, batch)
+                yield self.imported + self.rejected
+        finally:
+            if self.rejected_file is not None:
+                self.rejected_file.close()
+
+    def reject(self, row, reason):
+        """Write a row to the rejected file with the reason in the last column."""
+        if self.rejected_file is None:
+            self.rejected_file = open(self.rejected_filename, "w", newline="", encoding="utf-8")
+            self.rejected_writer = csv.writer(self.rejected_file)
+            self.rejected_writer.writerow([*self.header, "خطا"])
+        self.rejected_writer.writerow([*row, str(reason)])
+        self.rejected += 1
+
+    def save(self, rows, batch):
+        """Insert a batch; if the database refuses it, its rows are rejected."""
+        if not batch:
+            return
+        if self.record_model.insert_records(self.schema.id, batch) is not None:
+            self.imported += len(batch)
+            return
+        error = f"ذخیره نشد: {self.record_model.db.last_error}"
+        for row in rows:
+            self.reject(row, error)
+        self.failed += len(rows)
+
+
+class RecordExporter:
+    """Write the records of a form to a file one page at a time.
+
+    The file type comes from its suffix: .csv, .jsonl or .xlsx; XLSX needs
+    the optional openpyxl package. Records go to a temporary file that
+    replaces the file only when complete, so an existing file is never
+    left half written.
+    """
+
+    PAGE_SIZE = 1000
+
+    def __init__(self, form_id, filename):
+        self.form_id = form_id
+        self.filename = Path(filename)
+        self.temp_filename = self.filename.with_name(self.filename.name + ".tmp")
+        self.exported = 0
+
+    @staticmethod
+    def xlsx_available():
+        return importlib.util.find_spec("openpyxl") is not None
+
+    def run(self):
+        """Export records; yield the number of written records per page.
+
+        A canceled or failed export leaves the file as it was.
+        """
+        record_model = RecordModel()
+        header = record_model.get_header(self.form_id)
+        types = [field[2] for field in record_model.get_fields(self.form_id)]
+        records = (
+            (record[0], *map(format_value, types, record[1:]))
+            for record in record_model.iter_records(self.form_id, self.PAGE_SIZE)
+        )
+        writers = {".jsonl": self.write_jsonl, ".xlsx": self.write_xlsx}
+        writer = writers.get(self.filename.suffix.lower(), self.write_csv)
+        try:
+            yield from writer(header, records)
+            with open(self.temp_filename, "rb+") as f:
+                os.fsync(f.fileno())
+            os.replace(self.temp_filename, self.filename)
+        except BaseException:
+            self.temp_filename.unlink(missing_ok=True)
+            raise
+        return self.exported
+
+    def write_csv(self, header, records):
+        # NOTE: reverse data before save make it LTR; The table is RTL
+        with open(self.temp_filename, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header[::-1])
+            for record in records:
+                writer.writerow(record[1:][::-1])
+                yield from self.count()
+
+    def write_jsonl(self, header, records):
+        with open(self.temp_filename, "w", encoding="utf-8") as f:
+            for record in records:
+                row = {"id": record[0], **dict(zip(header, record[1:]))}
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                yield from self.count()
+
+    def write_xlsx(self, header, records):
+        from openpyxl import Workbook  # optional dependency
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(header)
+        for record in records:
+            sheet.append(list(record[1:]))
+            yield from self.count()
+        workbook.save(self.temp_filename)
+
+    def count(self):
+        self.exported += 1
+        if self.exported % self.PAGE_SIZE == 0:
+            yield self.exported
+
+
+class DataImportForm:
+    def __init__(self):
+        self.ui = load_ui("import.ui")
+        self.model = DataModel()
+        self.record_model = RecordModel()
+        self.importer = None
+        self.task = None
+
+        self.ui.form_names.addItems(self.model.get_form_names())
+        self.ui.form_names.setCurrentIndex(-1)
+        self.ui.form_names.currentTextChanged.connect(self.on_input_change)
+        self.ui.browse_button.clicked.connect(self.on_browse)
+        self.ui.import_button.clicked.connect(self.on_import)
+        self.ui.cancel_button.clicked.connect(self.on_cancel)
+
+    def refresh(self):
+        """Reload form names when the screen is shown again."""
+        reload_items(self.ui.form_names, self.model.get_form_names())
+        self.on_input_change()
+
+    def on_input_change(self):
+        ready = bool(self.ui.form_names.currentText() and self.ui.file_path.text())
+        self.ui.import_button.setEnabled(ready)
+
+    def on_browse(self):
+        filename, _ = QFileDialog.getOpenFileName(None, "Open File", "", "CSV Files (*.csv)")
+        if filename:
+            self.ui.file_path.setText(filename)
+            self.on_input_change()
+
+    def on_cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def on_import(self):
+        schema = self.model.get_schema_by_name(self.ui.form_names.currentText())
+        if schema is None:
+            return
+
+        self.importer = RecordImporter(self.record_model, schema, self.ui.file_path.text())
+        self.ui.progress.setMaximum(max(self.importer.count_rows(), 1))
+        self.ui.progress.setValue(0)
+        self.ui.import_button.setEnabled(False)
+        self.ui.cancel_button.setEnabled(True)
+
+        self.task = Task(self.importer.run)
+        self.task.signals.progress.connect(self.ui.progress.setValue)
+        self.task.signals.finished.connect(self.on_import_finish)
+        self.task.signals.failed.connect(self.on_import_finish)
+        self.task.start()
+
+    def on_import_finish(self, result):
+        importer = self.importer
+        report = f"{importer.imported} رکورد وارد شد. {importer.rejected} رکورد رد شد."
+        if importer.failed:
+            report += f"\n{importer.failed} رکورد به علت خطای پایگاه داده ذخیره نشد."
+        if importer.rejected:
+            report += f"\nگزارش رکوردهای رد شده: {importer.rejected_filename}"
+        if self.task.cancelled:
+            report = "عملیات لغو شد. " + report
+        elif isinstance(result, str):  # failed
+            report = f"خطا: {result}\n" + report
+        self.ui.report.setText(report)
+        self.ui.cancel_button.setEnabled(False)
+        self.on_input_change()
+        print(report)
+
+
+class RecordTableModel(QAbstractTableModel):
+    """Records of a form served to a QTableView on demand.
+
+    Records are fetched page by page on a worker thread only when the view
+    scrolls to them (canFetchMore/fetchMore), so opening a big form costs a
+    single page. Filters and sort run in the database, not in the view.
+    """
+
+    PAGE_SIZE = 500
+
+    def __init__(self, record_model, form_id, parent=None):
+        super().__init__(parent)
+        self.record_model = record_model
+        self.form_id = form_id
+        fields = record_model.get_fields(form_id)
+        self.field_ids = [field[0] for field in fields]
+        self.header = [field[1] for field in fields]
+        self.types = [field[2] for field in fields]
+        self.records = []  # (id, value1, value2, ...) as stored
+        self.has_more = True
+        self.filters = []  # (field_id, operator, value)
+        self.sort_by = None  # (field_id, descending); None for id order
+        self.generation = 0  # pages of an older query are dropped
+        self.loading = None  # task fetching a page
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.records)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.header)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        value = self.records[index.row()][index.column() + 1]
+        return format_value(self.types[index.column()], value)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.header[section]
+        return str(section + 1)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.has_more and self.loading is None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        if self.sort_by:
+            self.load(self.add_page, 0, len(self.records))
+        else:
+            self.load(self.add_page, self.records[-1][0] if self.records else 0, 0)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Sort in the database; column -1 restores id order."""
+        sort_by = None
+        if 0 <= column < len(self.field_ids):
+            sort_by = (self.field_ids[column], order == Qt.DescendingOrder)
+        if sort_by != self.sort_by:
+            self.set_query(self.filters, sort_by)
+
+    def set_query(self, filters, sort_by=None):
+        """Replace the records with the first page matching the query."""
+        self.filters = list(filters)
+        self.sort_by = sort_by
+        self.generation += 1
+        self.loading = None
+        self.load(self.reset_page, 0, 0)
+
+    def load(self, callback, after_id, offset):
+        generation = self.generation
+        task = Task(
+            self.record_model.find_records,
+            self.form_id,
+            self.filters,
+            self.sort_by,
+            after_id,
+            offset,
+            self.PAGE_SIZE,
+        )
+        task.signals.finished.connect(lambda page: self.on_load(generation, callback, page))
+        task.signals.failed.connect(lambda _: self.on_load(generation, self.add_page, []))
+        self.loading = task.start()
+
+    def on_load(self, generation, callback, page):
+        if generation != self.generation:
+            return  # query changed meanwhile
+        self.loading = None
+        callback(page or [])
+
+    def reset_page(self, page):
+        self.beginResetModel()
+        self.records = list(page)
+        self.has_more = len(page) == self.PAGE_SIZE
+        self.endResetModel()
+
+    def add_page(self, page):
+        self.has_more = len(page) == self.PAGE_SIZE
+        if not page:
+            return
+
+        first = len(self.records)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        self.records.extend(page)
+        self.endInsertRows()
+
+    def record_id(self, row):
+        return self.records[row][0]
+
+    def record_row(self, record_id):
+        """Row of a fetched record; -1 if it is not fetched."""
+        if self.sort_by:
+            ids = [record[0] for record in self.records]
+            return ids.index(record_id) if record_id in ids else -1
+        # unsorted records are fetched in id order
+        row = bisect_left(self.records, record_id, key=itemgetter(0))
+        if row < len(self.records) and self.records[row][0] == record_id:
+            return row
+        return -1
+
+    def set_record(self, record_id, values):
+        """Replace values of a fetched record and repaint only its row."""
+        row = self.record_row(record_id)
+        if row < 0:
+            return
+        self.records[row] = (record_id, *values)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.header) - 1))
+
+    def remove_records(self, record_ids):
+        """Remove fetched records from the view without a reset."""
+        rows = sorted({self.record_row(record_id) for record_id in record_ids} - {-1})
+        # remove blocks of consecutive rows, from the bottom up
+        while rows:
+            last = first = rows.pop()
+            while rows and rows[-1] == first - 1:
+                first = rows.pop()
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.records[first : last + 1]
+            self.endRemoveRows()
+
+    def apply_changes(self, records, deleted_ids):
+        """Show records other desktops changed; only their rows are touched.
+
+        New records are added only at the end of a fully fetched, unfiltered
+        list; anywhere else they come with the next query.
+        """
+        self.remove_records(deleted_ids)
+        new = []
+        for record in records:
+            if self.record_row(record[0]) >= 0:
+                self.set_record(record[0], record[1:])
+            elif not self.records or record[0] > self.records[-1][0]:
+                new.append(tuple(record))
+        if new and not (self.has_more or self.filters or self.sort_by):
+            first = len(self.records)
+            self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+            self.records.extend(sorted(new))
+            self.endInsertRows()
+
+    def record_count(self):
+        """Number of all records of the form; not only the fetched ones."""
+        return self.record_model.count_records(self.form_id)
+
+    def row_values(self, row):
+        return [self.data(self.index(row, col)) for col in range(len(self.header))]
+
+    def record_values(self, row):
+        """Values of a record as stored."""
+        return list(self.records[row][1:])
+
+    def refresh(self):
+        """Fetch the first page of the current query again."""
+        self.set_query(self.filters, self.sort_by)
+
+
+class DataSearchForm:
+    """Search the records of all forms at once."""
+
+    LIMIT = 100
+
+    def __init__(self):
+        self.ui = load_ui("search.ui")
+        self.record_model = RecordModel()
+        self.ui.query.returnPressed.connect(self.on_search)
+        self.ui.search_button.clicked.connect(self.on_search)
+        self.ui.results.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        self.ui.results.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)
+
+    def refresh(self):
+        """Search again; records may have changed on other screens."""
+        if self.ui.query.text().strip():
+            self.on_search()
+
+    def on_search(self):
+        text = self.ui.query.text().strip()
+        if not text:
+            return
+        task = Task(self.record_model.search_records, text, self.LIMIT)
+        task.signals.finished.connect(lambda hits: self.on_search_finish(text, hits))
+        self.task = task.start()
+
+    def on_search_finish(self, text, hits):
+        if text != self.ui.query.text().strip():
+            return  # query changed meanwhile
+        hits = hits or []
+        self.ui.results.setRowCount(len(hits))
+        for row, (_, form_name, record_id, snippet) in enumerate(hits):
+            for col, value in enumerate((form_name, str(record_id), snippet)):
+                self.ui.results.setItem(row, col, QTableWidgetItem(value))
+
+        report = f"{len(hits)} نتیجه"
+        if len(hits) == self.LIMIT:
+            report += f" (فقط {self.LIMIT} نتیجه اول)"
+        self.ui.report.setText(report)
+
+
 # view/update/delete
 class DataManageUI:
+    CHANGES_MS = 3000  # how often the view looks for changes of other desktops
+
     def __init__(self):
         self.ui = load_ui("view.ui")
-        # load form names
-        files = os.listdir(DATA_DIR)
-        # extract form ids
-        form_ids = [int(file.removesuffix(".csv")) for file in files if file.endswith(".csv")]
-        # get form name
         self.model = DataModel()
+        self.record_model = RecordModel()
 
-        # Extract forms that has csv file aka data.
-        form_names = []
-        for form_id in form_ids:
-            form_name = self.model.get_form_name(form_id)
-            if form_name is not None:
-                form_names.append(form_name)
+        # Extract forms that has records aka data.
+        form_names = [form[1] for form in self.record_model.get_forms_with_records()]
 
         self.ui.form_names.addItems(form_names)
         self.ui.form_names.currentTextChanged.connect(self.on_form_select)
         self.ui.save_button.clicked.connect(self.on_save_table)
         self.ui.delete_row.clicked.connect(self.on_delete)
         self.ui.update_row.clicked.connect(self.on_update)
-        self.header = []
-        self.rows = []
-        self.csv_file = ""
+        self.form_id = None
+        self.table_model = None
+        self.export_task = None
+        self.ui.export_cancel.clicked.connect(self.on_export_cancel)
+
+        # filter bar and sort; both run as queries on the record table
+        self.fields = []  # (id, name, type) of the selected form
+        self.filters = []
+        self.indexed_fields = set()
+        self.ui.filter_field.currentIndexChanged.connect(self.on_filter_field)
+        self.ui.filter_operator.currentTextChanged.connect(self.on_filter_operator)
+        self.ui.filter_value.returnPressed.connect(self.on_filter_add)
+        self.ui.filter_value_to.returnPressed.connect(self.on_filter_add)
+        self.ui.filter_add.clicked.connect(self.on_filter_add)
+        self.ui.filter_clear.clicked.connect(self.on_filter_clear)
+        self.ui.index_button.clicked.connect(self.on_index_toggle)
+        self.ui.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.ui.table.setSortingEnabled(True)
+
+        # records other desktops change show up without reloading the table
+        self.last_change = 0
+        self.data_version = None
+        self.changes_task = None
+        self.changes_timer = QTimer(self.ui)
+        self.changes_timer.setInterval(self.CHANGES_MS)
+        self.changes_timer.timeout.connect(self.on_changes_poll)
+        if self.record_model.db.shared:  # changes are logged only then
+            self.changes_timer.start()
+
+    def refresh(self):
+        """Reload form names and records when the screen is shown again."""
+        form_names = [form[1] for form in self.record_model.get_forms_with_records()]
+        if reload_items(self.ui.form_names, form_names):
+            self.refresh_table()
+        elif self.table_model is not None:
+            self.form_id = None
+            self.table_model = None
+            self.ui.table.setModel(None)
+            self.ui.save_button.setEnabled(False)
+            self.fields = []
+            self.filters = []
+            reload_items(self.ui.filter_field, [])
+            self.on_filter_field(-1)
+            self.show_filters()
 
     def on_form_select(self, form_name):
         form_id = self.model.get_form_id(form_name)
-        self.csv_file = DATA_DIR / f"{form_id}.csv"
-        self.df = pd.read_csv(self.csv_file)
-        self.populate_to_table(self.df)
+        self.last_change = self.record_model.last_change()
+        # first page loads on a worker thread; later pages when the view scrolls
+        task = Task(self.record_model.get_records_page, form_id, 0, RecordTableModel.PAGE_SIZE)
+        task.signals.finished.connect(lambda page: self.on_form_load(form_name, form_id, page))
+        self.task = task.start()
+
+    def on_form_load(self, form_name, form_id, page):
+        if form_name != self.ui.form_names.currentText():
+            return  # another form selected meanwhile
+        self.form_id = form_id
+        self.table_model = RecordTableModel(self.record_model, self.form_id)
+        self.table_model.add_page(page or [])
+        self.ui.table.setModel(self.table_model)
+        self.ui.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
         self.ui.save_button.setEnabled(True)
 
-    def populate_to_table(self, df):
-        table = self.ui.table
-        row_count = df.shape[0]
-        column_count = df.shape[1]
-        # table widget config
-        table.setRowCount(row_count)
-        table.setColumnCount(column_count)
-        table.setHorizontalHeaderLabels(df.columns.tolist())
-        self.header = df.columns.tolist()
-        # Populate the table with data
-        for row in range(row_count):
-            for col in range(column_count):
-                item = QTableWidgetItem(str(df.iat[row, col]))
-                table.setItem(row, col, item)
+        self.fields = self.record_model.get_fields(form_id)
+        self.filters = []
+        self.indexed_fields = self.record_model.get_indexed_fields(form_id)
+        reload_items(self.ui.filter_field, [field[1] for field in self.fields])
+        self.ui.filter_field.setCurrentIndex(0 if self.fields else -1)
+        self.on_filter_field(self.ui.filter_field.currentIndex())
+        self.show_filters()
+
+    def filter_field(self):
+        """(id, name, type) of the field selected in the filter bar."""
+        index = self.ui.filter_field.currentIndex()
+        return self.fields[index] if 0 <= index < len(self.fields) else None
+
+    def on_filter_field(self, index):
+        field = self.filter_field()
+        operators = list(FILTER_OPERATORS)
+        if field is None or field[2] not in RANGE_TYPES:
+            operators.remove("بازه")  # range of numbers and dates only
+        reload_items(self.ui.filter_operator, operators)
+        self.on_filter_operator(self.ui.filter_operator.currentText())
+
+        enabled = field is not None
+        for widget in (self.ui.filter_field, self.ui.filter_operator, self.ui.filter_value):
+            widget.setEnabled(enabled)
+        self.ui.filter_add.setEnabled(enabled)
+        self.ui.index_button.setEnabled(enabled)
+        self.ui.index_button.setChecked(enabled and field[0] in self.indexed_fields)
+
+    def on_filter_operator(self, operator):
+        self.ui.filter_value_to.setEnabled(FILTER_OPERATORS.get(operator) == "between")
+        self.ui.filter_value.setPlaceholderText("از" if operator == "بازه" else "مقدار")
+
+    def on_filter_add(self):
+        field = self.filter_field()
+        operator = FILTER_OPERATORS.get(self.ui.filter_operator.currentText())
+        if field is None or operator is None:
+            return
 
-        # NOTE: reverse data before save make it LTR; The table is RTL
-        self.rows = [row[::-1] for row in df.values.tolist()]
+        value = self.ui.filter_value.text().strip()
+        if operator == "between":
+            value = (value, self.ui.filter_value_to.text().strip())
+            if all(parse_value(Field(*field[1:]), bound) is None for bound in value):
+                print(f"{field[1]}: بازه نامعتبر")
+                return
+        elif not value:
+            return
+
+        self.filters.append((field[0], operator, value))
+        self.ui.filter_value.clear()
+        self.ui.filter_value_to.clear()
+        self.apply_filters()
+
+    def on_filter_clear(self):
+        self.filters = []
+        self.apply_filters()
+
+    def apply_filters(self):
+        self.show_filters()
+        if self.table_model is not None:
+            self.table_model.set_query(self.filters, self.table_model.sort_by)
+
+    def show_filters(self):
+        names = {field[0]: field[1] for field in self.fields}
+        operators = {operator: label for label, operator in FILTER_OPERATORS.items()}
+        texts = []
+        for field_id, operator, value in self.filters:
+            if operator == "between":
+                value = " تا ".join(bound or "…" for bound in value)
+            texts.append(f"{names.get(field_id, '?')} {operators[operator]} «{value}»")
+        self.ui.filters_label.setText("فیلترها: " + "، ".join(texts) if texts else "")
+        self.ui.filter_clear.setEnabled(bool(self.filters))
+
+    def on_index_toggle(self, checked):
+        """Create or drop the index of the selected field."""
+        field = self.filter_field()
+        if field is None:
+            return
+        # indexing a big form takes a while
+        action = self.record_model.create_index if checked else self.record_model.drop_index
+        self.ui.index_button.setEnabled(False)
+        task = Task(action, self.form_id, field[0])
+        task.signals.finished.connect(lambda _: self.on_index_change(self.form_id))
+        task.signals.failed.connect(lambda _: self.on_index_change(self.form_id))
+        self.task = task.start()
+
+    def on_index_change(self, form_id):
+        if form_id != self.form_id:
+            return
+        self.indexed_fields = self.record_model.get_indexed_fields(form_id)
+        self.on_filter_field(self.ui.filter_field.currentIndex())
+        names = [field[1] for field in self.fields if field[0] in self.indexed_fields]
+        print("Indexed fields:", ", ".join(names) or "-")
 
     def on_save_table(self):
-        if not self.rows:
+        if self.table_model is None or not self.table_model.record_count():
             print("There is no records to save!!!")
             self.ui.save_button.setEnabled(False)
             return
 
         # There is Data: Save data
-        csv_filename, _ = QFileDialog.getSaveFileName(
-            None, "Save File", "file.csv", "CSV Files (*.csv)"
+        file_types = {"CSV Files (*.csv)": ".csv", "JSON Lines (*.jsonl)": ".jsonl"}
+        if RecordExporter.xlsx_available():
+            file_types["Excel Files (*.xlsx)"] = ".xlsx"
+        filename, file_type = QFileDialog.getSaveFileName(
+            None, "Save File", "file.csv", ";;".join(file_types)
         )
 
-        print("filename: ", csv_filename)
-        if csv_filename:
-            # check if user add csv extention to filename
-            if not csv_filename.endswith(".csv"):
-                csv_filename += ".csv"
-
-            # save file which now has a name and csv extention
-            df = pd.DataFrame(self.rows, columns=self.header[::-1])
-            df.to_csv(csv_filename, index=False)
-            print(f"{csv_filename} saved succesfully.")
-
-    def save_table(self):
-        self.df.to_csv(self.csv_file, index=False)
-        print("Re-Save table.")
+        print("filename: ", filename)
+        if filename:
+            # check if user add the extention to filename
+            suffix = file_types.get(file_type, ".csv")
+            if Path(filename).suffix.lower() not in file_types.values():
+                filename += suffix
+
+            # export on a worker thread
+            self.export_filename = filename
+            self.ui.export_progress.setMaximum(self.table_model.record_count())
+            self.ui.export_progress.setValue(0)
+            self.ui.export_progress.show()
+            self.ui.export_cancel.show()
+            self.ui.save_button.setEnabled(False)
+            exporter = RecordExporter(self.form_id, filename)
+            self.export_task = Task(exporter.run)
+            self.export_task.signals.progress.connect(self.ui.export_progress.setValue)
+            self.export_task.signals.finished.connect(self.on_export_finish)
+            self.export_task.signals.failed.connect(self.on_export_finish)
+            self.export_task.start()
+
+    def on_export_cancel(self):
+        if self.export_task is not None:
+            self.export_task.cancel()
+
+    def on_export_finish(self, result):
+        self.ui.export_progress.hide()
+        self.ui.export_cancel.hide()
+        self.ui.save_button.setEnabled(True)
+        if self.export_task.cancelled:
+            print("Export canceled.")
+        elif isinstance(result, int):
+            print(f"{self.export_filename} saved succesfully: {result} records.")
+        else:
+            print(f"Export failed: {result}")
+        self.export_task = None
 
     def refresh_table(self):
-        # delete everything in table
-        self.ui.table.clear()
-        self.populate_to_table(self.df)
+        self.table_model.refresh()
         print("refresh table.")
 
+    def selected_row(self):
+        """Row index of the current record; -1 if no selection."""
+        if self.table_model is None:
+            return -1
+        return self.ui.table.currentIndex().row()
+
+    def selected_rows(self):
+        if self.table_model is None:
+            return []
+        return sorted(index.row() for index in self.ui.table.selectionModel().selectedRows())
+
     def on_delete(self):
-        selected_row = self.ui.table.currentRow()
-        if selected_row >= 0:  # -1 if no selection
-            self.ui.table.removeRow(selected_row)
-        self.df = self.df.drop(self.df.index[selected_row]).reset_index(drop=True)
-        self.save_table()
-        self.refresh_table()
+        selected_rows = self.selected_rows()
+        if not selected_rows:
+            return
+
+        record_ids = [self.table_model.record_id(row) for row in selected_rows]
+        task = Task(self.record_model.delete_records, self.form_id, record_ids)
+        task.signals.finished.connect(lambda done: self.on_deleted(record_ids, done))
+        self.task = task.start()
+
+    def on_deleted(self, record_ids, done):
+        if done:
+            self.table_model.remove_records(record_ids)
+            print(f"{len(record_ids)} records deleted.")
+
+    def on_changes_poll(self):
+        if self.table_model is None or self.changes_task is not None or not self.ui.isVisible():
+            return
+        # data_version moves only when another connection commits
+        data_version = self.record_model.db.fetch_one(""" PRAGMA data_version; """)[0]
+        if data_version == self.data_version:
+            return
+        self.data_version = data_version
+        model = self.table_model
+        task = Task(self.record_model.get_changes, self.form_id, self.last_change)
+        task.signals.finished.connect(lambda changes: self.on_changes(model, changes))
+        task.signals.failed.connect(lambda _: self.on_changes(None, None))
+        self.changes_task = task.start()
+
+    def on_changes(self, model, changes):
+        self.changes_task = None
+        if model is None or model is not self.table_model:
+            return  # failed, or another form selected meanwhile
+        if changes is None:  # too far behind; the log is pruned
+            self.last_change = self.record_model.last_change()
+            self.refresh_table()
+            return
+        self.last_change, records, deleted = changes
+        self.table_model.apply_changes(records, deleted)
 
     def get_column_names(self):
-        column_names = [
-            self.ui.table.horizontalHeaderItem(col).text()
-            for col in range(self.ui.table.columnCount())
-        ]
-        return column_names
+        return self.table_model.header
 
     def on_update(self):
-        selected_row = self.ui.table.currentRow()
-        # populate form with the selected row data
+        selected_row = self.selected_row()
+        if selected_row < 0:  # -1 if no selection
+            return
+
+        # the record as it is now; another desktop may have changed it
+        record_id = self.table_model.record_id(selected_row)
+        version = self.record_model.get_version(self.form_id, record_id)
+        records = self.record_model.get_records_by_ids(self.form_id, [record_id])
+        if version is None or not records:
+            print(f"Record {record_id} is deleted by another user.")
+            self.table_model.remove_records([record_id])
+            return
+        self.table_model.set_record(record_id, records[0][1:])
+
+        # editor is the insert form of the schema filled with the record
         form = DataInsertForm()
-        fields = []
-        # detect fields type. and make pair
-        if selected_row >= 0:  # -1 if no selection
-            header = self.get_column_names()
-            # first row to detect fields type.
-            row = [
-                self.ui.table.item(selected_row, col).text()
-                for col in range(self.ui.table.columnCount())
-            ]
-            data_row = []
-            for column, cell in zip(header, row):
-                minus_num = cell.count("-")
-                if minus_num == 2:  # date
-                    field = (column, "تاریخ شمسی")
-                elif minus_num == 4:
-                    field = (column, "شماره کارت")
-                elif minus_num == 8:
-                    field = (column, "شماره شبا")
-                else:
-                    field = (column, "متن")
-                fields.append(field)
-                data_row.append(cell.split("-"))
-
-            # build form
-            self.win = QMainWindow()
-            self.win.setLayoutDirection(Qt.RightToLeft)
-            frame = QFrame()
-            layout = QVBoxLayout()
-            frame.setLayout(layout)
-            form.build_form(fields, frame)
-            # Add button at the bottom
-            button = QPushButton("ذخیره")
-            layout.addWidget(button)
-            layout.addStretch()
-            self.win.setCentralWidget(frame)
-            self.win.show()
-            # populate selected row data over form widgets
-            for widgets, values in zip(form.rows, data_row):
-                for widget, value in zip(widgets, values):
-                    if isinstance(widget, QLineEdit):
-                        widget.setText(value)
-                    elif isinstance(widget, QComboBox):
-                        widget.setCurrentText(value)
-                    else:
-                        print(f"{widget} uknow to set value to it.")
-            button.clicked.connect(lambda: self.on_update_row(form.rows, selected_row))
-
-    def update_selected_row(self, selected_row, values):
-        for col, value in enumerate(values):
-            self.ui.table.setItem(selected_row, col, QTableWidgetItem(str(value)))
-
-    def on_update_row(self, rows, selected_row):
-        values = []
-        for widgets in rows:
-            value = []
-            for widget in widgets:
-                if isinstance(widget, QLineEdit):
-                    value.append(widget.text())
-                elif isinstance(widget, QComboBox):
-                    value.append(widget.currentText())
-                else:
-                    print(f"Cann't get of the value {widget}")
-            values.append(value)
+        schema = self.model.get_schema(self.form_id)
+        self.win = QMainWindow()
+        self.win.setLayoutDirection(Qt.RightToLeft)
+        frame = QFrame()
+        layout = QVBoxLayout()
+        frame.setLayout(layout)
+        form.build_form(schema.fields, frame)
+        # Add button at the bottom
+        button = QPushButton("ذخیره")
+        layout.addWidget(button)
+        layout.addStretch()
+        self.win.setCentralWidget(frame)
+        self.win.show()
+        form.set_values(records[0][1:])
+        button.clicked.connect(lambda: self.on_update_row(form, record_id, version))
+
+    def on_update_row(self, form, record_id, version):
+        try:
+            values = form.get_values()
+        except ValidationError as e:
+            print(e)
+            return
 
-        values = ["-".join(v) for v in values]
-        self.update_selected_row(selected_row, values)
         # close and delete win after doing update
         self.win.close()
         self.win.deleteLater()
-        # update dataframe
-        self.df.iloc[selected_row] = values
-        # update csv file and refresh tableo
-        self.save_table()
-        self.refresh_table()
+        # update the record and its row, unless another desktop changed it meanwhile
+        task = Task(self.record_model.update_record, self.form_id, record_id, values, version)
+        task.signals.finished.connect(lambda done: self.on_row_updated(record_id, values, done))
+        self.task = task.start()
+
+    def on_row_updated(self, record_id, values, done):
+        if done:
+            self.table_model.set_record(record_id, values)
+        elif done is False:
+            print(f"Record {record_id} was changed by another user; not saved.")
+            records = self.record_model.get_records_by_ids(self.form_id, [record_id])
+            if records:
+                self.table_model.set_record(record_id, records[0][1:])
+            else:
+                self.table_model.remove_records([record_id])
 
 
 # -- MultiChoice --
@@ -1154,16 +3821,11 @@ class MultiChoiceCreateForm:
         if self.is_input_empty():
             return
 
-        # save name of multi choice
+        # save name of multi choice with its options
         option_name = self.ui.mc_name.text()
-        option_id = self.model.save_option(option_name)
+        names = [le.text() for le in self.option_line_edits]
+        option_id = self.model.save_multichoice(option_name, names)
         print(f"table {option_id} saved successfully.")
-        names = []
-        if option_id:
-            for le in self.option_line_edits:
-                names.append((option_id, le.text()))
-
-        self.model.save_options(names)
         print(f"options saved. {names}")
 
 
@@ -1177,12 +3839,139 @@ class MultiChoiceDeleteForm:
         pass
 
 
+# ==================
+# -- Report --
+# ==================
+class ReportForm:
+    """Monthly report of a year or yearly report of all years.
+
+    Read from the rollups that RecordModel keeps for every record, so it
+    costs the same however many records there are.
+    """
+
+    def __init__(self):
+        self.ui = load_ui("report.ui")
+        self.record_model = RecordModel()
+        self.forms = []  # (id, name) of forms with records
+        self.ui.form_names.currentIndexChanged.connect(self.show_report)
+        self.ui.years.currentIndexChanged.connect(self.show_report)
+        self.ui.refresh_button.clicked.connect(self.refresh)
+        self.refresh()
+
+    def refresh(self):
+        self.forms = self.record_model.get_forms_with_records()
+        years = [str(year) for year in self.record_model.get_report_years()]
+        for combo, items in (
+            (self.ui.form_names, ["همه فرم‌ها"] + [form[1] for form in self.forms]),
+            (self.ui.years, ["همه سال‌ها"] + years),
+        ):
+            if not reload_items(combo, items):
+                combo.setCurrentIndex(0)
+        self.show_report()
+
+    def show_report(self):
+        form_index = self.ui.form_names.currentIndex() - 1  # -1: all forms
+        year = self.ui.years.currentText()
+        year = int(year) if year.isdigit() else None
+
+        if form_index < 0:
+            rows = self.record_model.get_form_counts(year)
+            columns = dict(self.forms)
+            cells = {
+                (bucket, form_id): count for bucket, form_id, count in rows if form_id in columns
+            }
+        else:
+            form_id = self.forms[form_index][0]
+            fields = self.record_model.get_fields(form_id)
+            rows = self.record_model.get_report(form_id, year)
+            columns = {(0, ""): "تعداد"}
+            columns.update({(f[0], ""): f"جمع {f[1]}" for f in fields if f[2] == "مبلغ"})
+            names = {f[0]: f[1] for f in fields if f[2] == "چند گزینه"}
+            for _, field_id, choice, _, _ in sorted(rows, key=itemgetter(1, 2)):
+                if field_id in names:
+                    columns[(field_id, choice)] = f"{names[field_id]}: {choice}"
+            cells = {}
+            for bucket, field_id, choice, count, total in rows:
+                if (field_id, choice) in columns:
+                    # amount columns show the sum; the rest count records
+                    amount = field_id and not choice
+                    cells[(bucket, (field_id, choice))] = total if amount else count
+
+        if year is None:
+            buckets = sorted({cell[0] for cell in cells})
+            labels = [str(bucket) if bucket else "بدون تاریخ" for bucket in buckets]
+        else:
+            buckets = range(1, len(SHAMSI_MONTHS) + 1)
+            labels = list(SHAMSI_MONTHS)
+        self.fill_table(list(columns.items()), list(zip(buckets, labels)), cells)
+
+    def fill_table(self, columns, buckets, cells):
+        """Rows of buckets and a total row; columns as (key, header)."""
+        table = self.ui.table
+        table.clear()
+        table.setColumnCount(len(columns))
+        table.setRowCount(len(buckets) + 1)
+        table.setHorizontalHeaderLabels([header for _, header in columns])
+        table.setVerticalHeaderLabels([label for _, label in buckets] + ["جمع"])
+        for col, (key, _) in enumerate(columns):
+            values = [cells.get((bucket, key), 0) for bucket, _ in buckets]
+            for row, value in enumerate(values + [sum(values)]):
+                table.setItem(row, col, QTableWidgetItem(f"{value:,}".translate(PERSIAN_DIGITS)))
+
+
+# ==================
+# -- Diagnostics --
+# ==================
+class DiagnosticsForm:
+    """Slowest queries, screen switches and tasks of this session."""
+
+    def __init__(self):
+        self.ui = load_ui("diagnostics.ui")
+        self.ui.refresh_button.clicked.connect(self.refresh)
+        self.ui.clear_button.clicked.connect(self.on_clear)
+        self.ui.log_label.setText(f"فایل لاگ: {LOG_FILE}")
+        self.refresh()
+
+    def refresh(self):
+        spans = [
+            (datetime.fromtimestamp(at).strftime("%H:%M:%S"), name, seconds, rows)
+            for seconds, at, name, rows in timings().slowest_spans()
+        ]
+        self.fill_table(self.ui.slowest_table, ["زمان", "عملیات", "مدت (ms)", "ردیف"], spans)
+        totals = [
+            (name, count, seconds, seconds / count, longest, rows)
+            for name, count, seconds, longest, rows in timings().total_spans()
+        ]
+        header = ["عملیات", "تعداد", "مجموع (ms)", "میانگین (ms)", "بیشترین (ms)", "ردیف"]
+        self.fill_table(self.ui.totals_table, header, totals)
+
+    def on_clear(self):
+        timings().clear()
+        self.refresh()
+
+    def fill_table(self, table, header, rows):
+        table.clear()
+        table.setColumnCount(len(header))
+        table.setRowCount(len(rows))
+        table.setHorizontalHeaderLabels(header)
+        for row, values in enumerate(rows):
+            for col, value in enumerate(values):
+                if isinstance(value, float):
+                    value = f"{value * 1000:,.1f}"  # seconds
+                table.setItem(row, col, QTableWidgetItem("" if value is None else str(value)))
+        table.resizeColumnsToContents()
+
+
 class MainWindow(QMainWindow):
+    # Keep built screens alive and reuse them instead of rebuilding on every switch
+    KEEP_SCREENS = True
+
     def __init__(self):
         super().__init__()
         self.init()
         self.layout = QVBoxLayout()
         self.frame = None
+        self.screens = {}  # screen class -> built screen
 
         # Menubar
         self.menubar()
@@ -1219,7 +4008,11 @@ class MainWindow(QMainWindow):
         data_form_menu = menubar.addMenu("داده")
         data_insert_from_action = QAction("افزودن داده", self)
         data_manage_action = QAction("مدیریت داده", self)
-        data_form_menu.addActions([data_insert_from_action, data_manage_action])
+        data_import_action = QAction("وارد کردن داده از فایل", self)
+        data_search_action = QAction("جستجو در داده‌ها", self)
+        data_form_menu.addActions(
+            [data_insert_from_action, data_manage_action, data_import_action, data_search_action]
+        )
 
         ### Multichoice
         mc_menu = menubar.addMenu("چند گزینه")
@@ -1237,7 +4030,10 @@ class MainWindow(QMainWindow):
         help_action = QAction("مستندات برنامه", self)
         help_contact_action = QAction("تماس با ما", self)
         help_about_action = QAction("درباره برنامه", self)
-        help_menu.addActions([help_action, help_contact_action, help_about_action])
+        help_diagnostics_action = QAction("عیب‌یابی کارایی", self)
+        help_menu.addActions(
+            [help_action, help_contact_action, help_about_action, help_diagnostics_action]
+        )
 
         ### EVENTS
         # Table Form
@@ -1247,8 +4043,14 @@ class MainWindow(QMainWindow):
         # Data
         data_insert_from_action.triggered.connect(self.load_data_insert_form)
         data_manage_action.triggered.connect(self.load_data_manage)
+        data_import_action.triggered.connect(self.load_data_import_form)
+        data_search_action.triggered.connect(self.load_data_search_form)
         # Multichoice
         mc_create_form_action.triggered.connect(self.load_mc_create_form)
+        # Report
+        report_yearly_action.triggered.connect(self.load_report_form)
+        # Help
+        help_diagnostics_action.triggered.connect(self.load_diagnostics_form)
 
     def main(self):
         mainframe = QFrame()
@@ -1258,53 +4060,111 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(mainframe)
 
     def statusbar(self):
-        pass
+        # busy indicator of the background tasks
+        self.busy = QProgressBar()
+        self.busy.setRange(0, 0)
+        self.busy.setMaximumWidth(150)
+        self.busy_cancel = QPushButton("لغو")
+        self.busy_cancel.clicked.connect(task_monitor().cancel_all)
+        self.statusBar().addPermanentWidget(self.busy)
+        self.statusBar().addPermanentWidget(self.busy_cancel)
+        self.on_tasks_change(0)
+        task_monitor().changed.connect(self.on_tasks_change)
+
+    def on_tasks_change(self, count):
+        self.busy.setVisible(count > 0)
+        self.busy_cancel.setVisible(count > 0)
+
+    def closeEvent(self, event):
+        # records of the rapid entry still in memory are written before quitting
+        for screen in {*self.screens.values(), self.frame}:
+            if hasattr(screen, "flush"):
+                screen.flush(wait=True)
+        super().closeEvent(event)
 
     def clear_mainframe(self, index=0):
         item = self.layout.takeAt(index)
         if item:
-            item.widget().deleteLater()
+            if self.KEEP_SCREENS:
+                item.widget().hide()
+            else:
+                item.widget().deleteLater()
+
+    def load_screen(self, screen_class):
+        """Show a screen; a kept screen is refreshed instead of rebuilt."""
+        with timings().span(f"screen {screen_class.__name__}"):
+            self.clear_mainframe()
+            screen = self.screens.get(screen_class)
+            if screen is None:
+                screen = screen_class()
+                if self.KEEP_SCREENS:
+                    self.screens[screen_class] = screen
+            elif hasattr(screen, "refresh"):
+                screen.refresh()
+
+            self.frame = screen
+            self.layout.addWidget(screen.ui)
+            screen.ui.show()
 
     def load_table_create_form(self):
-        self.clear_mainframe()
-        self.frame = TableCreateForm()
-        self.layout.addWidget(self.frame.ui)
+        self.load_screen(TableCreateForm)
 
     def load_data_insert_form(self):
-        self.clear_mainframe()
-        self.frame = DataInsertForm()
-        self.layout.addWidget(self.frame.ui)
+        self.load_screen(DataInsertForm)
 
     def load_data_manage(self):
-        self.clear_mainframe()
-        self.frame = DataManageUI()
-        self.layout.addWidget(self.frame.ui)
+        self.load_screen(DataManageUI)
+
+    def load_data_import_form(self):
+        self.load_screen(DataImportForm)
+
+    def load_data_search_form(self):
+        self.load_screen(DataSearchForm)
 
     def load_table_update_form(self):
-        self.clear_mainframe()
-        self.frame = TableUpdateForm()
-        self.layout.addWidget(self.frame.ui)
+        self.load_screen(TableUpdateForm)
         print("Table update")
 
     def load_table_delete_form(self):
-        self.clear_mainframe()
-        self.frame = TableDeleteForm()
-        self.layout.addWidget(self.frame.ui)
+        self.load_screen(TableDeleteForm)
         print("Table delete")
 
     # Multichoice
     def load_mc_create_form(self):
-        self.clear_mainframe()
-        self.frame = MultiChoiceCreateForm()
-        self.layout.addWidget(self.frame.ui)
+        self.load_screen(MultiChoiceCreateForm)
         print("Multichoice create")
 
+    # Report
+    def load_report_form(self):
+        self.load_screen(ReportForm)
+
+    # Help
+    def load_diagnostics_form(self):
+        self.load_screen(DiagnosticsForm)
+
     @classmethod
-    def run(self):
-        app = QApplication(sys.argv)
+    def start(self, data_dir=DATA_DIR):
+        """Prepare the database and show the window; QApplication must exist."""
+        prepare_database(data_dir)
         window = MainWindow()
         window.show()
-        sys.exit(app.exec())
+        return window
+
+    @classmethod
+    def run(self):
+        setup_logging()
+        app = QApplication(sys.argv)
+        try:
+            with timings().span("start"):
+                window = self.start()
+        except MigrationError as e:
+            log.error("Startup aborted: %s", e)
+            QMessageBox.critical(None, "خطا", f"پایگاه داده به روز نشد؛ برنامه بسته می شود.\n{e}")
+            sys.exit(1)
+        code = app.exec()
+        QThreadPool.globalInstance().waitForDone()
+        Database.close_all()
+        sys.exit(code)
 
 
 if __name__ == "__main__":
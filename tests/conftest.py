@@ -0,0 +1,51 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import main
+
+
+def reset_caches():
+    """Models share connections and caches by file name; every test gets new ones."""
+    main.Database.close_all()
+    main.Database.instances.clear()
+    main.FormSchema.invalidate()
+    main.RecordModel.synced.clear()
+    main.record_journal.cache_clear()
+
+
+@pytest.fixture
+def baseline_db(tmp_path, monkeypatch):
+    """Copy of the shipped forms.db, with the forms of the baseline, in the cwd."""
+    shutil.copy(main.BASE_DIR / "forms.db", tmp_path / "forms.db")
+    monkeypatch.chdir(tmp_path)
+    reset_caches()
+    yield tmp_path / "forms.db"
+    reset_caches()
+
+
+@pytest.fixture
+def fresh_db(baseline_db):
+    """forms.db of a new install: the baseline schema and field types, no forms."""
+    with sqlite3.connect(baseline_db) as conn:
+        for table in ("fields", "forms", "options", "option"):
+            conn.execute(f"DELETE FROM {table};")
+    return baseline_db
+
+
+@pytest.fixture
+def db(fresh_db):
+    """Migrated fresh database."""
+    main.migrate_database()
+    return main.Database.open("forms.db")
+
+
+@pytest.fixture
+def form_id(db):
+    option_id = main.OptionModel().save_multichoice("رنگ", ["قرمز", "آبی"])
+    fields = [("نام", "متن", None), ("تعداد", "عدد", None), ("رنگ", "چند گزینه", option_id)]
+    return main.FormModel().save_form("آزمون", fields)
@@ -0,0 +1,90 @@
+import json
+import sqlite3
+
+import pytest
+
+import api
+
+
+@pytest.fixture
+def client(form_id):
+    form_api = api.FormApi()
+
+    def call(method, target, body=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        try:
+            return form_api.handle(method, target, data)
+        except api.ApiError as e:
+            return e.status, {"error": str(e)}
+
+    return call
+
+
+def test_bulk_insert_and_cursor_pages(client, form_id):
+    records = [[f"r{i}", i, "آبی"] for i in range(25)]
+    assert client("POST", f"/forms/{form_id}/records", {"records": records}) == (
+        201,
+        {"inserted": 25},
+    )
+    names, cursor = [], 0
+    while cursor is not None:
+        status, page = client("GET", f"/forms/{form_id}/records?limit=10&cursor={cursor}")
+        assert status == 200
+        names += [record["values"]["نام"] for record in page["records"]]
+        cursor = page["next_cursor"]
+    assert names == [f"r{i}" for i in range(25)]
+
+
+def test_bulk_insert_with_an_invalid_record_saves_nothing(client, form_id):
+    records = [["a", 1, "آبی"], {"نام": "b", "تعداد": "x", "رنگ": "آبی"}, ["c", 3, "سبز"]]
+    status, payload = client("POST", f"/forms/{form_id}/records", {"records": records})
+    assert status == 422
+    assert [error["index"] for error in payload["errors"]] == [1, 2]
+    assert client("GET", f"/forms/{form_id}/records")[1]["records"] == []
+
+
+def test_update_with_a_stale_version_conflicts(client, form_id):
+    client("POST", f"/forms/{form_id}/records", {"records": [["a", 1, "آبی"]]})
+    status, record = client("GET", f"/forms/{form_id}/records/1")
+    assert (status, record["version"]) == (200, 0)
+
+    values = ["b", 2, "قرمز"]
+    assert client("PUT", f"/forms/{form_id}/records/1", {"values": values, "version": 0}) == (
+        200,
+        {"id": 1, "version": 1},
+    )
+    status, _ = client("PUT", f"/forms/{form_id}/records/1", {"values": values, "version": 0})
+    assert status == 409
+    assert client("GET", f"/forms/{form_id}/records/1")[1]["values"]["نام"] == "b"
+
+
+def test_update_with_invalid_values(client, form_id):
+    client("POST", f"/forms/{form_id}/records", {"records": [["a", 1, "آبی"]]})
+    status, _ = client("PUT", f"/forms/{form_id}/records/1", {"values": ["a", "x", "آبی"]})
+    assert status == 422
+
+
+def test_form_names_are_unique(client):
+    body = {"name": "آزمون", "fields": [{"name": "نام", "type": "متن"}]}
+    assert client("POST", "/forms", body)[0] == 409
+
+
+@pytest.mark.parametrize(
+    "method, target, status",
+    [
+        ("GET", "/forms/999", 404),
+        ("GET", "/forms/{form_id}/records/999", 404),
+        ("PATCH", "/forms", 405),
+        ("GET", "/forms/{form_id}/records?limit=x", 400),
+    ],
+)
+def test_errors(client, form_id, method, target, status):
+    assert client(method, target.format(form_id=form_id))[0] == status
+
+
+def test_form_changed_by_another_desktop_is_reloaded(client, form_id):
+    assert client("GET", f"/forms/{form_id}")[1]["name"] == "آزمون"
+    with sqlite3.connect("forms.db") as conn:  # another desktop renames the form
+        conn.execute("UPDATE forms SET name = 'آزمون ۲' WHERE id = ?;", (form_id,))
+        conn.execute("UPDATE schema_version SET version = version + 1;")
+    assert client("GET", f"/forms/{form_id}")[1]["name"] == "آزمون ۲"
@@ -0,0 +1,72 @@
+import main
+
+
+def crash(journal):
+    """Leave the journal as a killed app would: entries on disk, lock released."""
+    journal.file.close()
+
+
+def count(form_id):
+    return main.RecordModel().count_records(form_id)
+
+
+def test_replay_writes_a_crashed_session_once(form_id):
+    journal = main.RecordJournal("desk")
+    for i in range(3):
+        journal.append(form_id, [f"r{i}", 1, "آبی"])
+    crash(journal)
+
+    assert main.RecordJournal("desk").replay() == 3
+    assert count(form_id) == 3
+    assert main.RecordJournal("desk").replay() == 0
+    assert count(form_id) == 3
+
+
+def test_applied_entries_are_not_replayed(form_id):
+    journal = main.RecordJournal("desk")
+    entries = [(journal.append(form_id, ["r", 1, "آبی"]), form_id, ["r", 1, "آبی"])]
+    journal.apply(entries)
+    crash(journal)  # before the journal was truncated
+
+    assert main.RecordJournal("desk").replay() == 0
+    assert count(form_id) == 1
+
+
+def test_two_clients_keep_their_own_entries(form_id):
+    a, b = main.RecordJournal("desk-a"), main.RecordJournal("desk-b")
+    a_entries = [
+        (a.append(form_id, [f"a{i}", 1, "آبی"]), form_id, [f"a{i}", 1, "آبی"]) for i in range(2)
+    ]
+    for i in range(3):
+        b.append(form_id, [f"b{i}", 1, "آبی"])
+    a.apply(a_entries)
+    a.truncate()
+    crash(b)
+
+    assert main.RecordJournal("desk-b").replay() == 3
+    assert count(form_id) == 5
+    assert main.RecordJournal("desk-b").replay() == 0
+    assert count(form_id) == 5
+
+
+def test_journal_of_a_running_session_is_not_replayed(form_id):
+    running = main.RecordJournal("desk")
+    entries = [(running.append(form_id, ["r", 1, "آبی"]), form_id, ["r", 1, "آبی"])]
+
+    other = main.RecordJournal("desk")  # a second app of the same desktop
+    assert other.replay() == 0
+    assert other.key == "desk-2"
+    assert count(form_id) == 0
+
+    running.apply(entries)
+    assert count(form_id) == 1
+
+
+def test_records_of_deleted_forms_are_dropped(form_id):
+    journal = main.RecordJournal("desk")
+    journal.append(form_id, ["r", 1, "آبی"])
+    crash(journal)
+    main.FormModel().delete_form(form_id)
+
+    assert main.RecordJournal("desk").replay() == 1
+    assert not main.RecordModel().table_exists(form_id)
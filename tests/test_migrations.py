@@ -0,0 +1,67 @@
+import shutil
+import sqlite3
+
+import pytest
+
+import main
+
+
+def tables(db):
+    sql = """ SELECT name FROM sqlite_master WHERE type IN ('table', 'index'); """
+    return {row[0] for row in db.fetch_all(sql)}
+
+
+def test_fresh_database_is_migrated(fresh_db):
+    db = main.Database.open("forms.db")
+    assert db.migrate(main.MIGRATIONS) == len(main.MIGRATIONS)
+    assert {"record_changes", "journal_clients", "fields_form_id_index"} <= tables(db)
+    assert "journal_state" not in tables(db)
+
+
+def test_migrations_run_once(fresh_db):
+    db = main.Database.open("forms.db")
+    db.migrate(main.MIGRATIONS)
+    assert db.migrate(main.MIGRATIONS) == len(main.MIGRATIONS)
+
+
+def test_failed_migration_stops_startup(fresh_db):
+    def broken(db):
+        """Migration that fails halfway."""
+        db.execute(""" CREATE TABLE half_done (id INTEGER); """)
+        db.execute(""" SELECT * FROM no_such_table; """)
+
+    db = main.Database.open("forms.db")
+    with pytest.raises(main.MigrationError):
+        db.migrate((*main.MIGRATIONS, broken))
+    assert db.fetch_one(""" PRAGMA user_version; """)[0] == 0
+    assert "half_done" not in tables(db)
+
+
+def test_baseline_database_keeps_forms_and_drops_leftovers(baseline_db):
+    with sqlite3.connect(baseline_db) as conn:
+        forms = conn.execute("SELECT id, name FROM forms ORDER BY id;").fetchall()
+        # records table of a form deleted before the migrations
+        conn.execute("CREATE TABLE records_999 (id INTEGER PRIMARY KEY, f_1 TEXT);")
+
+    main.migrate_database()
+    db = main.Database.open("forms.db")
+    assert db.fetch_all(""" SELECT id, name FROM forms ORDER BY id; """) == forms
+    assert "records_999" not in tables(db)
+    assert "report_rollups_counts_index" in tables(db)
+
+
+def test_baseline_csv_records_are_imported(baseline_db, tmp_path):
+    data_dir = tmp_path / "data"
+    shutil.copytree(main.BASE_DIR / "data", data_dir)
+    main.migrate_database()
+    form_ids = {form[0] for form in main.FormModel().get_forms()}
+    csv_files = [path for path in data_dir.glob("*.csv") if int(path.stem) in form_ids]
+    assert csv_files
+
+    main.RecordModel().migrate_csv_files(data_dir)
+    for path in csv_files:
+        assert path.with_name(path.name + ".imported").exists()
+        assert main.RecordModel().count_records(int(path.stem)) > 0
+    # a second start imports nothing again
+    main.RecordModel().migrate_csv_files(data_dir)
+    assert not list(data_dir.glob("*.csv.imported.imported"))
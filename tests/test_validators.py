@@ -0,0 +1,79 @@
+import pytest
+
+import main
+
+
+def validate(field_type, text, options=()):
+    field = main.Field("فیلد", field_type, options=list(options))
+    return main.FIELD_VALIDATORS[field_type](field, text)
+
+
+@pytest.mark.parametrize(
+    "field_type, text, stored",
+    [
+        ("عدد", "۱۲۳", 123),
+        ("مبلغ", "1,250,000", 1250000),
+        ("شماره حساب", "1234-5678-9012-3456", "1234567890123456"),
+        ("شماره کارت", "۱۲۳۴۵۶۷۸۹۰۱۲۳۴۵۶", "1234567890123456"),
+        ("شماره شبا", "IR-1234-1234-1234-1234-1234-1234-", "123412341234123412341234"),
+        ("تاریخ شمسی", "1404-اردیبهشت-14", 14040214),
+        ("تاریخ شمسی", "۱۴۰۴/۲/۵", 14040205),
+        ("شماره تماس", "09121234567", "09121234567"),
+        ("کد ملی", "0012345678", "0012345678"),
+        ("متن", "نام", "نام"),
+    ],
+)
+def test_stored_values_round_trip(field_type, text, stored):
+    assert validate(field_type, text) == stored
+    # the shown text validates back to the same stored value
+    assert validate(field_type, main.format_value(field_type, stored)) == stored
+
+
+@pytest.mark.parametrize(
+    "field_type, text, shown",
+    [
+        ("شماره کارت", "۱۲-۳۴۵۶-۷۸۹۰-۱۲۳۴", "۱۲-۳۴۵۶-۷۸۹۰-۱۲۳۴"),
+        ("شماره حساب", "1-22-333-4444", "۱-۲۲-۳۳۳-۴۴۴۴"),
+        ("شماره شبا", "IR-۱-۲-۳-۴-۵-۶-۷", "IR-۱-۲-۳-۴-۵-۶-۷"),
+    ],
+)
+def test_short_groups_keep_their_digits(field_type, text, shown):
+    stored = validate(field_type, text)
+    assert "-" in stored
+    assert main.format_value(field_type, stored) == shown
+    assert validate(field_type, shown) == stored
+
+
+@pytest.mark.parametrize(
+    "field_type, text",
+    [
+        ("عدد", "12a"),
+        ("شماره کارت", "12345-1234-1234-1234"),
+        ("شماره کارت", "1234-1234-1234"),
+        ("شماره شبا", "1234-1234-1234-1234-1234-1234"),
+        ("تاریخ شمسی", "1404-13-01"),
+        ("متن", "  "),
+    ],
+)
+def test_invalid_values_are_rejected(field_type, text):
+    with pytest.raises(main.ValidationError):
+        validate(field_type, text)
+
+
+def test_multichoice_accepts_only_its_options():
+    assert validate("چند گزینه", "آبی", ["قرمز", "آبی"]) == "آبی"
+    with pytest.raises(main.ValidationError):
+        validate("چند گزینه", "سبز", ["قرمز", "آبی"])
+
+
+@pytest.mark.parametrize(
+    "text, pattern",
+    [
+        ("1404-اردیبهشت", "140402__"),
+        ("اردیبهشت-14", "____0214"),
+        ("1404", None),
+        ("x-y", None),
+    ],
+)
+def test_date_contains_pattern(text, pattern):
+    assert main.shamsi_date_pattern(text) == pattern